@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Compares throughput of qr_draw called in loop with qr_draw_many.
+
+Usage: python benchmarks/batch.py
+"""
+import os
+import sys
+import time
+
+# package is imported from source tree
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reportlab.pdfgen import canvas
+
+from reportlab_qr_code import qr_draw, qr_draw_many, grid_positions
+
+
+COUNT = 1000
+STYLE = {'size': '2cm', 'fg': '#203040', 'radius': 0.3, 'error_correction': 'M'}
+
+
+def get_items():
+	positions = grid_positions(8, 10, '2.5cm', '2.5cm', x='0.5cm', y='0.5cm')
+	return [(f'LABEL-{num:06d}', *positions[num % len(positions)]) for num in range(COUNT)]
+
+
+def draw_loop(c, items):
+	for text, x, y in items:
+		qr_draw(c, text, x=x, y=y, **STYLE)
+
+
+def draw_many(c, items):
+	qr_draw_many(c, items, **STYLE)
+
+
+def measure(draw):
+	items = get_items()
+	c = canvas.Canvas(None)
+	start = time.perf_counter()
+	draw(c, items)
+	return COUNT / (time.perf_counter() - start)
+
+
+def main():
+	loop = measure(draw_loop)
+	many = measure(draw_many)
+	print(f"{'method':>14} {'codes/s':>10}")
+	print(f"{'qr_draw':>14} {loop:>10.1f}")
+	print(f"{'qr_draw_many':>14} {many:>10.1f} ({many / loop:.2f}x)")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Compares bitmap backends (array, numpy and packed bits) on clearing holes and
+masking draw parts. Bulk loading of modules is compared with loading cell by
+cell using drawrect.
+
+Usage: python benchmarks/bitmap.py
+"""
+import os
+import sys
+import timeit
+
+# package is imported from source tree
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reportlab_qr_code import ReportlabImageBase, build_qrcode, parse_params_string
+
+
+VERSIONS = [10, 25, 40]
+PARAMS = 'version={version},hole=35%:35%:30%:30%,error_correction=H,draw=all-align-eyes,draw=alignpupils,draw=alignballs,draw=eyeballs,draw=eyepupils;text;Benchmark'
+REPEAT = 5
+NUMBER = 20
+BACKENDS = ['array', 'numpy', 'packed']
+
+
+def load_modules(img):
+	img.load_modules()
+
+
+def mask_bitmaps(img):
+	img.clear_area()
+	for part in img.draw_parts:
+		img.begin_part(part)
+		img.finish_part()
+
+
+def draw_modules(img):
+	for row, line in enumerate(img.modules):
+		for col, module in enumerate(line):
+			if module:
+				img.drawrect(row, col)
+
+
+def set_backend(backend):
+	ReportlabImageBase.use_numpy = backend == 'numpy'
+	ReportlabImageBase.use_packed_bitmap = backend == 'packed'
+
+
+def build(backend, version):
+	set_backend(backend)
+	return build_qrcode(*parse_params_string(PARAMS.format(version=version)))
+
+
+def measure(backend, version, stmt):
+	img = build(backend, version)
+	timer = timeit.Timer(lambda: stmt(img))
+	return min(timer.repeat(repeat=REPEAT, number=NUMBER)) / NUMBER
+
+
+def main():
+	print(f"{'version':>8} {'stage':>8} {'cells [ms]':>12} {'bulk [ms]':>12} {'speedup':>8}")
+	for version in VERSIONS:
+		drawrect_time = measure('array', version, draw_modules)
+		load_time = measure('array', version, load_modules)
+		print(f"{version:>8} {'load':>8} {drawrect_time * 1000:>12.3f} {load_time * 1000:>12.3f} {drawrect_time / load_time:>7.2f}x")
+	print()
+	print(f"{'version':>8} {'stage':>8}" + ''.join(f"{backend + ' [ms]':>14}" for backend in BACKENDS) + f"{'array [B]':>12}{'packed [B]':>12}")
+	for version in VERSIONS:
+		times = [measure(backend, version, mask_bitmaps) for backend in BACKENDS]
+		sizes = [sys.getsizeof(build(backend, version).bitmap.value if backend == 'packed' else build(backend, version).bitmap) for backend in ('array', 'packed')]
+		print(f"{version:>8} {'masks':>8}" + ''.join(f"{value * 1000:>14.3f}" for value in times) + ''.join(f"{size:>12}" for size in sizes))
+
+
+if __name__ == "__main__":
+	main()
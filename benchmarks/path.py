@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Compares writing of code paths using reportlab path object with direct
+writing of PDF operators.
+
+Usage: python benchmarks/path.py
+"""
+import os
+import sys
+import timeit
+
+# package is imported from source tree
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reportlab.pdfgen import canvas
+
+from reportlab_qr_code import ReportlabImageBase, build_qrcode, parse_params_string
+
+
+VERSIONS = [10, 25, 40]
+RADIUSES = [0, 0.5]
+REPEAT = 5
+NUMBER = 10
+
+
+def measure(use_fast_path, version, radius):
+	ReportlabImageBase.use_fast_path = use_fast_path
+	img = build_qrcode(*parse_params_string(f'version={version},radius={radius};text;Benchmark'))
+	img.get_part_segments()
+	c = canvas.Canvas(None)
+	timer = timeit.Timer(lambda: img.save(c))
+	return min(timer.repeat(repeat=REPEAT, number=NUMBER)) / NUMBER
+
+
+def main():
+	print(f"{'version':>8} {'radius':>8} {'path [ms]':>12} {'direct [ms]':>12} {'speedup':>8}")
+	for radius in RADIUSES:
+		for version in VERSIONS:
+			path_time = measure(False, version, radius)
+			direct_time = measure(True, version, radius)
+			print(f"{version:>8} {radius:>8} {path_time * 1000:>12.3f} {direct_time * 1000:>12.3f} {path_time / direct_time:>7.2f}x")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+Compares outline tracing (draw_mode=path) with decomposition of bitmap to
+rectangles (draw_mode=rects). Measures time of geometry generation and size of
+uncompressed PDF content.
+
+Usage: python benchmarks/rects.py
+"""
+import os
+import sys
+import timeit
+
+# package is imported from source tree
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reportlab.pdfgen import canvas
+
+from reportlab_qr_code import build_qrcode, parse_params_string
+
+
+VERSIONS = [1, 5, 10, 25, 40]
+REPEAT = 5
+NUMBER = 10
+
+
+def get_image(version, draw_mode):
+	return build_qrcode(*parse_params_string(f'version={version},draw_mode={draw_mode};text;Benchmark'))
+
+
+def measure_time(version, draw_mode):
+	img = get_image(version, draw_mode)
+
+	def generate():
+		img.part_segments = None
+		img.get_part_segments()
+
+	timer = timeit.Timer(generate)
+	return min(timer.repeat(repeat=REPEAT, number=NUMBER)) / NUMBER
+
+
+def measure_size(version, draw_mode):
+	c = canvas.Canvas(None, pageCompression=0)
+	get_image(version, draw_mode).save(c)
+	return len(c.getpdfdata())
+
+
+def main():
+	print(f"{'version':>8} {'path [ms]':>12} {'rects [ms]':>12} {'speedup':>8} {'path [B]':>10} {'rects [B]':>10} {'ratio':>6}")
+	for version in VERSIONS:
+		path_time = measure_time(version, 'path')
+		rects_time = measure_time(version, 'rects')
+		path_size = measure_size(version, 'path')
+		rects_size = measure_size(version, 'rects')
+		print(f"{version:>8} {path_time * 1000:>12.3f} {rects_time * 1000:>12.3f} {path_time / rects_time:>7.2f}x {path_size:>10} {rects_size:>10} {rects_size / path_size:>6.2f}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Measures startup time of package and command line tool
+
+Import time is measured using python -X importtime in fresh interpreter,
+slowest modules are listed. Command line tool is run for each output format.
+Fails with exit code 1 if import of command line module takes longer than
+budget.
+
+Usage:
+	python benchmarks/startup.py [--budget 200] [--top 10]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+# package is imported from source tree in measured processes
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ['reportlab_qr_code', 'reportlab_qr_code.__main__']
+CLI_FORMATS = {
+	'PDF': [],
+	'SVG': [],
+	'EPS': [],
+	'PNG': ['--size', '29', '--padding', '4', '--version', '1'],
+}
+REPEAT = 5
+BUDGET = 200.0
+TOP = 10
+
+
+def get_env():
+	env = os.environ.copy()
+	env['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT, env.get('PYTHONPATH')]))
+	return env
+
+
+def import_times(module):
+	"""
+	Returns dict of module name to cumulative import time in ms
+	"""
+	result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], capture_output=True, text=True, check=True, env=get_env())
+	times = {}
+	for line in result.stderr.splitlines():
+		if not line.startswith('import time:') or 'cumulative' in line:
+			continue
+		__, cumulative, name = line[12:].split('|')
+		times[name.strip()] = int(cumulative) / 1000
+	return times
+
+
+def run_time(argv):
+	start = time.perf_counter()
+	subprocess.run([sys.executable, '-m', 'reportlab_qr_code', *argv], check=True, stdout=subprocess.DEVNULL, env=get_env())
+	return time.perf_counter() - start
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Measure startup time")
+	parser.add_argument('--budget', type=float, default=BUDGET, help="Maximal import time of command line module in ms")
+	parser.add_argument('--top', type=int, default=TOP, help="Number of listed slowest modules")
+	parser.add_argument('--repeat', type=int, default=REPEAT, help="Number of repeats, minimum is used")
+	args = parser.parse_args()
+
+	results = {}
+	for module in MODULES:
+		samples = [import_times(module) for __ in range(args.repeat)]
+		best = min(samples, key=lambda times, module=module: times[module])
+		results[module] = best[module]
+		print(f"import {module}: {best[module]:.1f} ms")
+		for name, value in sorted(best.items(), key=lambda item: -item[1])[1:args.top + 1]:
+			print(f"  {name:<48} {value:>8.1f} ms")
+	print()
+
+	print(f"{'format':>8} {'run [ms]':>10}")
+	with tempfile.TemporaryDirectory() as directory:
+		for file_format, options in CLI_FORMATS.items():
+			argv = ['--format', file_format, '--outfile', os.path.join(directory, f'code.{file_format.lower()}'), *options, 'Startup']
+			value = min(run_time(argv) for __ in range(args.repeat))
+			print(f"{file_format:>8} {value * 1000:>10.1f}")
+
+	cli_time = results['reportlab_qr_code.__main__']
+	if cli_time > args.budget:
+		print(f"Import of command line module takes {cli_time:.1f} ms, budget is {args.budget:.1f} ms", file=sys.stderr)
+		sys.exit(1)
+
+
+if __name__ == "__main__":
+	main()
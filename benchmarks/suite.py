@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite of whole render pipeline
+
+Measures encoding (build_qrcode) for all versions and error correction levels,
+tracing, path drawing, part masking and command line backends. Results can be
+saved as baseline and compared with later runs. Comparison fails with exit
+code 1 if any case is slower than baseline multiplied by threshold. Baseline
+should be recorded on the same machine.
+
+Usage:
+	python benchmarks/suite.py [--filter build/40] [--save baseline.json]
+	python benchmarks/suite.py --compare baseline.json [--threshold 1.25]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import timeit
+
+# package is imported from source tree
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reportlab.pdfgen import canvas
+
+from reportlab_qr_code import ReportlabImageBase, build_qrcode, parse_params_string
+from reportlab_qr_code.__main__ import main as cli_main
+
+
+VERSIONS = [1, 10, 25, 40]
+ERROR_CORRECTIONS = ['L', 'M', 'Q', 'H']
+DRAW_RECIPES = {
+	'eyes': 'draw=all-eyes,draw=eyes',
+	'eyes_align': 'draw=all-eyes-align,draw=eyeballs,draw=eyepupils,draw=align',
+	'hole': 'hole=35%:35%:30%:30%,draw=all-eyes,draw=eyeballs,draw=eyepupils',
+}
+CLI_FORMATS = ['PDF', 'SVG', 'PNG']
+REPEAT = 3
+THRESHOLD = 1.25
+
+
+def build(params):
+	return build_qrcode(*parse_params_string(f'{params};text;Benchmark'))
+
+
+def build_case(version, error_correction):
+	params = parse_params_string(f'version={version},error_correction={error_correction};text;Benchmark')
+	return lambda: build_qrcode(*params)
+
+
+def segments_case(version):
+	img = build(f'version={version}')
+	return img.get_segments
+
+
+def draw_code_case(version):
+	img = build(f'version={version}')
+	segments = img.get_segments()
+	c = canvas.Canvas(None)
+	return lambda: img.draw_code(c.beginPath(), segments)
+
+
+def draw_rounded_code_case(version):
+	img = build(f'version={version},radius=0.5')
+	segments = img.get_segments()
+	c = canvas.Canvas(None)
+	return lambda: img.draw_rounded_code(c.beginPath(), segments)
+
+
+def begin_part_case(recipe, version):
+	img = build(f'version={version},{DRAW_RECIPES[recipe]}')
+
+	def mask_parts():
+		img.clear_area()
+		for part in img.draw_parts:
+			img.begin_part(part)
+			img.finish_part()
+
+	return mask_parts
+
+
+def cli_case(file_format, version, directory):
+	# integer size of modules, raster formats are drawn directly
+	width = version * 4 + 17
+	outfile = os.path.join(directory, f'{version}.{file_format.lower()}')
+	argv = ['reportlab_qr_code', '--version', str(version), '--size', str(width + 8), '--padding', '4', '--format', file_format, '--outfile', outfile, 'Benchmark']
+
+	def run():
+		sys_argv = sys.argv
+		sys.argv = argv
+		try:
+			cli_main()
+		finally:
+			sys.argv = sys_argv
+
+	return run
+
+
+def get_cases(directory):
+	"""
+	Returns list of (name, factory), factory returns measured function
+	"""
+	cases = []
+	for version in VERSIONS:
+		for error_correction in ERROR_CORRECTIONS:
+			cases.append((f'build/{version}/{error_correction}', lambda v=version, e=error_correction: build_case(v, e)))
+	for version in VERSIONS:
+		cases.append((f'get_segments/{version}', lambda v=version: segments_case(v)))
+		cases.append((f'draw_code/{version}', lambda v=version: draw_code_case(v)))
+		cases.append((f'draw_rounded_code/{version}', lambda v=version: draw_rounded_code_case(v)))
+		for recipe in DRAW_RECIPES:
+			cases.append((f'begin_part/{recipe}/{version}', lambda r=recipe, v=version: begin_part_case(r, v)))
+		for file_format in CLI_FORMATS:
+			cases.append((f'cli/{file_format}/{version}', lambda f=file_format, v=version: cli_case(f, v, directory)))
+	return cases
+
+
+def measure(stmt, repeat):
+	timer = timeit.Timer(stmt)
+	number, __ = timer.autorange()
+	return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Run benchmark suite")
+	parser.add_argument('--filter', type=str, help="Run only cases containing this text")
+	parser.add_argument('--repeat', type=int, default=REPEAT, help="Number of repeats, minimum is used")
+	parser.add_argument('--save', type=str, help="Save results as JSON baseline")
+	parser.add_argument('--compare', type=str, help="Compare results with JSON baseline")
+	parser.add_argument('--threshold', type=float, default=THRESHOLD, help="Maximal allowed ratio of time to baseline")
+	args = parser.parse_args()
+
+	baseline = {}
+	if args.compare:
+		with open(args.compare, 'r', encoding='utf-8') as fp:
+			baseline = json.load(fp)
+
+	print(f"backend: {'packed' if ReportlabImageBase.use_packed_bitmap else 'numpy' if ReportlabImageBase.use_numpy else 'array'}")
+	print(f"{'case':<32} {'time [ms]':>12} {'baseline [ms]':>14} {'ratio':>7}")
+	results = {}
+	regressions = []
+	with tempfile.TemporaryDirectory() as directory:
+		for name, factory in get_cases(directory):
+			if args.filter and args.filter not in name:
+				continue
+			results[name] = measure(factory(), args.repeat)
+			line = f"{name:<32} {results[name] * 1000:>12.3f}"
+			if name in baseline:
+				ratio = results[name] / baseline[name]
+				line += f" {baseline[name] * 1000:>14.3f} {ratio:>6.2f}x"
+				if ratio > args.threshold:
+					regressions.append(name)
+					line += " REGRESSION"
+			print(line)
+
+	if args.save:
+		with open(args.save, 'w', encoding='utf-8') as fp:
+			json.dump(results, fp, indent='\t', sort_keys=True)
+	if regressions:
+		print(f"{len(regressions)} regressions over {args.threshold:.2f}x: {', '.join(regressions)}", file=sys.stderr)
+		sys.exit(1)
+
+
+if __name__ == "__main__":
+	main()
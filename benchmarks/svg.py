@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Compares SVG output of command line interface written using reportlab
+renderSVG with direct SVG writer. Measures time and size of output.
+
+Usage: python benchmarks/svg.py
+"""
+import io
+import os
+import sys
+import timeit
+
+# package is imported from source tree
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reportlab_qr_code import build_qrcode, parse_params_string
+from reportlab_qr_code.__main__ import CanvasAdapter, SvgCanvas
+
+
+VERSIONS = [5, 10, 25, 40]
+RADIUSES = [0, 0.5]
+REPEAT = 3
+NUMBER = 1
+
+
+def render_svg(img):
+	output = io.BytesIO()
+	c = CanvasAdapter(output, 'SVG')
+	c.setPageSize((img.size, img.size))
+	c.saveState()
+	img.save(c)
+	c.restoreState()
+	c.showPage()
+	return output.getvalue()
+
+
+def write_svg(img):
+	output = io.BytesIO()
+	c = SvgCanvas(output)
+	c.setPageSize((img.size, img.size))
+	c.draw_qrcode(img)
+	c.showPage()
+	return output.getvalue()
+
+
+def measure(render, version, radius):
+	img = build_qrcode(*parse_params_string(f'version={version},radius={radius};text;Benchmark'))
+	img.get_part_segments()
+	timer = timeit.Timer(lambda: render(img))
+	return min(timer.repeat(repeat=REPEAT, number=NUMBER)) / NUMBER, len(render(img))
+
+
+def main():
+	print(f"{'version':>8} {'radius':>8} {'renderSVG [ms]':>15} {'direct [ms]':>12} {'speedup':>8} {'renderSVG [B]':>14} {'direct [B]':>11} {'ratio':>6}")
+	for radius in RADIUSES:
+		for version in VERSIONS:
+			render_time, render_size = measure(render_svg, version, radius)
+			write_time, write_size = measure(write_svg, version, radius)
+			print(f"{version:>8} {radius:>8} {render_time * 1000:>15.3f} {write_time * 1000:>12.3f} {render_time / write_time:>7.2f}x {render_size:>14} {write_size:>11} {write_size / render_size:>6.2f}")
+
+
+if __name__ == "__main__":
+	main()
@@ -1,25 +1,52 @@
 # -*- coding: utf-8 -*-
 import array
+import contextvars
+import hashlib
+import importlib.util
 import itertools
 import math
+import mmap
 import operator
+import os
 import re
+import struct
+import threading
+import time
 from base64 import b64decode
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
 from copy import deepcopy
-from dataclasses import dataclass
-from typing import List, Union, Tuple
+from dataclasses import dataclass, field
+from functools import lru_cache, partial
+from types import MappingProxyType
+from typing import Callable, Iterator, List, Mapping, Union, Tuple
 
 import qrcode
+from reportlab.lib.colors import toColor
+from reportlab.lib.rl_accel import fp_str
 from reportlab.lib.units import toLength
-from reportlab.pdfgen.canvas import FILL_EVEN_ODD, Canvas
+from reportlab.pdfbase.pdfdoc import PDFDictionary, PDFResourceDictionary
+from reportlab.pdfgen.canvas import FILL_EVEN_ODD, PATH_OPS, Canvas
 
 
+# numpy is optional and slow to import, it's imported when first needed
+NUMPY_AVAILABLE = importlib.util.find_spec('numpy') is not None
+
 DEFAULT_PARAMS = {
 	'version': None,
 	'error_correction': 'L',
 }
 FALSE_VALUES = {'off', 'false', 'False', '0', False, 0, None}
 QR_PARAMS = {'version', 'error_correction'}
+# Parameters changing traced segments
+GEOMETRY_PARAMS = {'version', 'error_correction', 'invert', 'hole', 'radius', 'enhanced_path', 'draw_mode'}
+GEOMETRY_PART_PARAMS = {'draw', 'hole', 'radius', 'enhanced_path', 'draw_mode'}
+DRAW_MODES = ('path', 'rects')
+# Parameters which are not part of image style
+DRAW_OPTIONS = {'cache', 'form'}
+STYLE_CACHE_SIZE = 1024
+# Draw masks are built from user supplied draw operations
+DRAW_MASK_CACHE_SIZE = 256
 QR_ERROR_CORRECTIONS = {
 	'L': qrcode.ERROR_CORRECT_L,
 	'M': qrcode.ERROR_CORRECT_M,
@@ -39,6 +66,14 @@ DIRECTION_TURNS_CHECKS = (
 	( 0, -1), # up
 )
 
+# Swaps 0 and 1 bytes
+INVERT_TABLE = bytes([1, 0]) + bytes(range(2, 256))
+# Conversion of modules to binary digits and back
+BITS_TABLE = bytes.maketrans(b'\x00\x01', b'01')
+UNPACK_BITS_TABLE = bytes.maketrans(b'01', b'\x00\x01')
+# Run of modules in bitmap row
+RUN_PATTERN = re.compile(b'\x01+')
+
 LENGTH_ABSOLUTE = 0
 LENGTH_PIXELS = 1
 LENGTH_RELATIVE = 2
@@ -116,6 +151,36 @@ class Transforms:
 	def to_float(val: Union[str, float]) ->float:
 		return float(val)
 
+	@staticmethod
+	def to_color(val):
+		"""
+		Validate color, value is not converted
+		"""
+		if val is not None:
+			toColor(val)
+		return val
+
+	@staticmethod
+	def to_padding(val: Union[str, int, float]) -> Union[str, int, float]:
+		"""
+		Validate padding in modules, percents of size or length, value is
+		converted when code size is known
+		"""
+		if isinstance(val, str) and '%' in val:
+			float(val[:-1])
+			return val
+		try:
+			float(val)
+		except ValueError:
+			Transforms.to_length(val)
+		return val
+
+	@staticmethod
+	def to_draw_mode(val: str) -> str:
+		if val not in DRAW_MODES:
+			raise ValueError(f"Unknown draw mode `{val}`, expected one of {', '.join(DRAW_MODES)}")
+		return val
+
 	@staticmethod
 	def to_area(val: str) -> List[Tuple[Length, Length, Length, Length]]:
 		"""
@@ -140,12 +205,539 @@ class Transforms:
 		return coordinates
 
 
+class RenderStats:
+	"""
+	Wall time of render stages and counters collected using instrument()
+
+	Stages are encode, load, matrix_cache, mask, trace and emit, times don't
+	overlap. Statistics can be shared between threads.
+	"""
+
+	def __init__(self):
+		self.timings = {}
+		self.counters = {}
+		self.lock = threading.Lock()
+
+	@contextmanager
+	def measure(self, stage: str):
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.add_time(stage, time.perf_counter() - start)
+
+	def add_time(self, stage: str, seconds: float):
+		with self.lock:
+			self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+	def count(self, counter: str, value: int = 1):
+		with self.lock:
+			self.counters[counter] = self.counters.get(counter, 0) + value
+
+	def as_dict(self) -> dict:
+		"""
+		Returns copy of statistics as {'timings': {stage: seconds}, 'counters': {name: value}}
+		"""
+		with self.lock:
+			return {'timings': dict(self.timings), 'counters': dict(self.counters)}
+
+	def clear(self):
+		with self.lock:
+			self.timings.clear()
+			self.counters.clear()
+
+
+# Statistics enabled in current context
+current_stats = contextvars.ContextVar('current_stats', default=None)
+NO_MEASURE = nullcontext()
+
+
+@contextmanager
+def instrument(stats: RenderStats = None):
+	"""
+	Collect statistics of codes built and drawn inside of with block
+
+	Statistics are collected only in current thread (context), same stats can
+	be passed to instrument() in other threads.
+	"""
+	stats = RenderStats() if stats is None else stats
+	token = current_stats.set(stats)
+	try:
+		yield stats
+	finally:
+		current_stats.reset(token)
+
+
+def measure_stage(stage: str):
+	"""
+	Returns context manager measuring stage time if instrumentation is enabled
+	"""
+	stats = current_stats.get()
+	return NO_MEASURE if stats is None else stats.measure(stage)
+
+
+def add_count(counter: str, value: int = 1):
+	stats = current_stats.get()
+	if stats is not None:
+		stats.count(counter, value)
+
+
+class GeometryCache:
+	"""
+	LRU cache of traced segments
+
+	Size is measured as number of cached coordinates. Least recently used
+	codes are evicted if size exceeds max_size. Cache can be shared between
+	threads.
+	"""
+
+	def __init__(self, max_size: int = 200000):
+		self.max_size = max_size
+		self.size = 0
+		self.hits = 0
+		self.misses = 0
+		self.entries = OrderedDict()
+		self.lock = threading.Lock()
+
+	def __len__(self):
+		return len(self.entries)
+
+	def get_key(self, params: dict, text: bytes) -> tuple:
+		"""
+		Returns key from data and parameters affecting bitmap
+		"""
+		return (text, self.get_params_key(params))
+
+	@staticmethod
+	def get_params_key(params: dict) -> tuple:
+		"""
+		Returns hashable key from parameters affecting bitmap
+		"""
+		key = {key: value for key, value in params.items() if key in GEOMETRY_PARAMS}
+		key['draw_parts'] = [
+			{key: value for key, value in part.items() if key in GEOMETRY_PART_PARAMS}
+			for part in params.get('draw_parts', [])
+		]
+		# holes with absolute units depends on code size
+		if 'hole' in params or any('hole' in part for part in key['draw_parts']):
+			key['size'] = params.get('size')
+			key['padding'] = params.get('padding')
+		return freeze_value(key)
+
+	def get(self, key: tuple):
+		"""
+		Returns tuple (width, part_segments, size, modules) or None
+		"""
+		with self.lock:
+			geometry = self.entries.get(key)
+			if geometry is None:
+				self.misses += 1
+				return None
+			self.hits += 1
+			self.entries.move_to_end(key)
+			return geometry
+
+	def put(self, key: tuple, width: int, part_segments: List[List[List[Tuple[int, int]]]], modules: bytes = None):
+		size = sum(len(segment) for segments in part_segments for segment in segments)
+		with self.lock:
+			if key in self.entries:
+				self.size -= self.entries.pop(key)[2]
+			self.entries[key] = (width, part_segments, size, modules)
+			self.size += size
+			while self.size > self.max_size and self.entries:
+				self.size -= self.entries.popitem(last=False)[1][2]
+
+	def clear(self):
+		with self.lock:
+			self.entries.clear()
+			self.size = 0
+			self.hits = 0
+			self.misses = 0
+
+
+geometry_cache = GeometryCache()
+
+
+class MatrixCache:
+	"""
+	Persistent LRU cache of encoded module matrices stored in directory
+
+	Each matrix is stored in separate file as bit-packed modules. Size is
+	measured in bytes, least recently read files are removed if size exceeds
+	max_size. Files are replaced atomically, so directory can be shared
+	between processes. Process sees only own writes between scans of
+	directory, directory is scanned again after each process writes
+	max_size / SCAN_DIVISOR bytes.
+	"""
+
+	HEADER = struct.Struct('>4sB')
+	MAGIC = b'QRM1'
+	SUFFIX = '.qrm'
+	SCAN_DIVISOR = 16
+
+	def __init__(self, directory: str, max_size: int = 64 * 1024 * 1024):
+		self.directory = os.fspath(directory)
+		self.max_size = max_size
+		self.size = None
+		self.written = 0
+		self.hits = 0
+		self.misses = 0
+		self.lock = threading.Lock()
+		os.makedirs(self.directory, exist_ok=True)
+
+	def get_key(self, qr_kwargs: dict, text: bytes) -> str:
+		"""
+		Returns file name from data hash, version and error correction
+		"""
+		digest = hashlib.sha256(text).hexdigest()
+		return f'{digest}-{qr_kwargs.get("version")}-{qr_kwargs.get("error_correction")}{self.SUFFIX}'
+
+	def get(self, key: str):
+		"""
+		Returns tuple (width, modules) or None, modules are bytes of 0 and 1
+		"""
+		path = os.path.join(self.directory, key)
+		try:
+			with open(path, 'rb') as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as data:
+				matrix = self.unpack(data)
+		except (OSError, ValueError, struct.error):
+			matrix = None
+		else:
+			try:
+				# time of last use for eviction
+				os.utime(path)
+			except OSError:
+				pass
+		with self.lock:
+			if matrix is None:
+				self.misses += 1
+			else:
+				self.hits += 1
+		return matrix
+
+	def put(self, key: str, width: int, modules: bytes):
+		data = self.pack(width, modules)
+		# tempfile is slow to import and it's needed only here
+		import tempfile
+
+		fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+		try:
+			with os.fdopen(fd, 'wb') as fp:
+				fp.write(data)
+			os.replace(tmp_path, os.path.join(self.directory, key))
+		except OSError:
+			os.unlink(tmp_path)
+			return
+		with self.lock:
+			if self.size is not None:
+				self.size += len(data)
+				self.written += len(data)
+			# other processes write to same directory
+			if self.size is None or self.size > self.max_size or self.written > self.max_size // self.SCAN_DIVISOR:
+				self.evict()
+
+	def pack(self, width: int, modules: bytes) -> bytes:
+		"""
+		Returns header followed by modules packed to bits (big-endian)
+		"""
+		count = width * width
+		if len(modules) != count:
+			raise ValueError("Modules don't match width %d" % width)
+		packed = PackedBitmap.from_bytes(modules).value.to_bytes((count + 7) // 8, 'big')
+		return self.HEADER.pack(self.MAGIC, width) + packed
+
+	def unpack(self, data) -> Tuple[int, bytes]:
+		magic, width = self.HEADER.unpack_from(data)
+		count = width * width
+		packed = data[self.HEADER.size:]
+		if magic != self.MAGIC or len(packed) != (count + 7) // 8:
+			raise ValueError("Corrupted matrix")
+		value = int.from_bytes(packed, 'big')
+		if value >> count:
+			raise ValueError("Corrupted matrix")
+		return width, bytes(PackedBitmap(count, value))
+
+	def get_files(self) -> List[os.DirEntry]:
+		with os.scandir(self.directory) as entries:
+			return [entry for entry in entries if entry.name.endswith(self.SUFFIX) and entry.is_file()]
+
+	def evict(self):
+		"""
+		Remove least recently used files until size is within max_size
+		"""
+		files = []
+		for entry in self.get_files():
+			try:
+				stat = entry.stat()
+			except OSError: # pragma: no cover
+				# removed by other process
+				continue
+			files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+		files.sort()
+		self.size = sum(size for __, size, __ in files)
+		self.written = 0
+		for __, size, path in files:
+			if self.size <= self.max_size:
+				break
+			try:
+				os.unlink(path)
+			except OSError: # pragma: no cover
+				pass
+			self.size -= size
+
+	def clear(self):
+		with self.lock:
+			for entry in self.get_files():
+				try:
+					os.unlink(entry.path)
+				except OSError: # pragma: no cover
+					pass
+			self.size = 0
+			self.written = 0
+			self.hits = 0
+			self.misses = 0
+
+
+# Matrix caches created from directory names
+matrix_caches = {}
+matrix_caches_lock = threading.Lock()
+
+
+def get_align_positions(width: int) -> List[Tuple[int, int]]:
+	"""
+	Returns centers of align patterns of code with given width
+	"""
+	version = (width - 21) // 4 + 1
+	if not 1 <= version <= len(ALIGN_POSITION_TABLE):
+		return []
+	positions = []
+	for x in ALIGN_POSITION_TABLE[version - 1]:
+		for y in ALIGN_POSITION_TABLE[version - 1]:
+			# exclude eyes
+			if x < 8 and y < 8 or x > width - 8 and y < 8 or x < 8 and y > width - 8:
+				continue
+			positions.append((x, y))
+	return positions
+
+
+def combined_area(*names: str) -> Callable[[int], List[Tuple[int, int, int, int]]]:
+	return lambda width: [rectangle for name in names for rectangle in AREAS[name](width)]
+
+
+# Named areas, functions returning rectangles (x, y, w, h) for code width
+AREAS = {
+	'all': lambda width: [(0, 0, width, width)],
+	'eye1': lambda width: [(0, 0, 7, 7)],
+	'eye2': lambda width: [(width - 7, 0, 7, 7)],
+	'eye3': lambda width: [(0, width - 7, 7, 7)],
+	'eyes': combined_area('eye1', 'eye2', 'eye3'),
+	'eyepupil1': lambda width: [(2, 2, 3, 3)],
+	'eyepupil2': lambda width: [(width - 5, 2, 3, 3)],
+	'eyepupil3': lambda width: [(2, width - 5, 3, 3)],
+	'eyepupils': combined_area('eyepupil1', 'eyepupil2', 'eyepupil3'),
+	'eyeball1': lambda width: [(0, 0, 7, 1), (0, 6, 7, 1), (0, 1, 1, 5), (6, 1, 1, 5)],
+	'eyeball2': lambda width: [(width - 7, 0, 7, 1), (width - 7, 6, 7, 1), (width - 7, 1, 1, 5), (width - 1, 1, 1, 5)],
+	'eyeball3': lambda width: [(0, width - 7, 7, 1), (0, width - 1, 7, 1), (0, width - 6, 1, 5), (6, width - 6, 1, 5)],
+	'eyeballs': combined_area('eyeball1', 'eyeball2', 'eyeball3'),
+	'align': lambda width: [(x - 2, y - 2, 5, 5) for x, y in get_align_positions(width)],
+	'alignpupils': lambda width: [(x, y, 1, 1) for x, y in get_align_positions(width)],
+	'alignballs': lambda width: [
+		rectangle
+		for x, y in get_align_positions(width)
+		for rectangle in [(x - 2, y - 2, 5, 1), (x - 2, y + 2, 5, 1), (x - 2, y - 1, 1, 3), (x + 2, y - 1, 1, 3)]
+	],
+}
+
+
+@dataclass(frozen=True)
+class Area:
+	"""
+	Named area of code with given width
+	"""
+
+	rectangles: Tuple[Tuple[int, int, int, int], ...]
+	# one byte for each module, 1 inside area
+	mask: int
+	# one bit for each module, 1 inside area
+	bits: int
+
+
+def clip_rectangles(width: int, rectangles: List[Tuple[int, int, int, int]]) -> Tuple[Tuple[int, int, int, int], ...]:
+	clipped = []
+	for x, y, w, h in rectangles:
+		x2, y2 = min(x + w, width), min(y + h, width)
+		x, y = max(x, 0), max(y, 0)
+		if x < x2 and y < y2:
+			clipped.append((x, y, x2 - x, y2 - y))
+	return tuple(clipped)
+
+
+def get_area_mask(width: int, rectangles: Tuple[Tuple[int, int, int, int], ...]) -> int:
+	mask = bytearray(width * width)
+	for x, y, w, h in rectangles:
+		line = b'\x01' * w
+		for row in range(y, y + h):
+			mask[row * width + x:row * width + x + w] = line
+	return int.from_bytes(mask, 'big')
+
+
+def get_area_bits(width: int, rectangles: Tuple[Tuple[int, int, int, int], ...]) -> int:
+	bits = 0
+	for x, y, w, h in rectangles:
+		line = ((1 << w) - 1) << (width - x - w)
+		for row in range(y, y + h):
+			bits |= line << ((width - row - 1) * width)
+	return bits
+
+
+@dataclass
+class PackedBitmap:
+	"""
+	Bitmap with one bit for each module, first module is most significant bit
+
+	Bitmap behaves like sequence of 0 and 1 values, bytes(bitmap) returns one
+	byte for each module.
+	"""
+
+	size: int
+	value: int = 0
+
+	@classmethod
+	def from_bytes(cls, bitmap: bytes) -> 'PackedBitmap':
+		return cls(len(bitmap), int(bitmap.translate(BITS_TABLE), 2))
+
+	def __bytes__(self) -> bytes:
+		return format(self.value, f'0{self.size}b').encode('ascii').translate(UNPACK_BITS_TABLE)
+
+	def __len__(self) -> int:
+		return self.size
+
+	def __iter__(self):
+		return iter(bytes(self))
+
+	def __getitem__(self, addr: int) -> int:
+		return (self.value >> (self.size - addr - 1)) & 1
+
+	def __setitem__(self, addr: int, value: int):
+		bit = 1 << (self.size - addr - 1)
+		self.value = self.value | bit if value else self.value & ~bit
+
+
+@lru_cache(maxsize=None)
+def get_area_index(width: int) -> Mapping[str, Area]:
+	"""
+	Returns all named areas of code with given width, index is built only
+	once for each version
+	"""
+	index = {}
+	for name, area in AREAS.items():
+		rectangles = clip_rectangles(width, area(width))
+		index[name] = Area(rectangles, get_area_mask(width, rectangles), get_area_bits(width, rectangles))
+	return MappingProxyType(index)
+
+
+def register_area(name: str, area: Union[Callable[[int], List[Tuple[int, int, int, int]]], List[Tuple[int, int, int, int]]]):
+	"""
+	Register custom named area, which can be used in draw parameter
+
+	Area is list of rectangles (x, y, w, h) in modules or function returning
+	list of rectangles for code width.
+	"""
+	if not re.match(r'^\w+$', name):
+		raise ValueError(f"Wrong area name `{name}`")
+	if name in AREAS:
+		raise ValueError(f"Area {name} already exists")
+	if not callable(area):
+		rectangles = [tuple(rectangle) for rectangle in area]
+		area = lambda width: rectangles
+	AREAS[name] = area
+	get_area_index.cache_clear()
+	get_draw_mask.cache_clear()
+
+
+def freeze_value(value):
+	"""
+	Convert lists and dicts to hashable tuples
+	"""
+	if isinstance(value, dict):
+		return tuple(sorted((key, freeze_value(val)) for key, val in value.items()))
+	if isinstance(value, (list, tuple)):
+		return tuple(freeze_value(val) for val in value)
+	return value
+
+
+def freeze_params(value):
+	"""
+	Returns read only deep copy of parameters, dicts are converted to mapping
+	proxies and lists to tuples
+	"""
+	if isinstance(value, (dict, MappingProxyType)):
+		return MappingProxyType({key: freeze_params(val) for key, val in value.items()})
+	if isinstance(value, (list, tuple)):
+		return tuple(freeze_params(val) for val in value)
+	return value
+
+
+def thaw_params(value):
+	"""
+	Returns mutable deep copy of parameters, inverse of freeze_params
+	"""
+	if isinstance(value, (dict, MappingProxyType)):
+		return {key: thaw_params(val) for key, val in value.items()}
+	if isinstance(value, (list, tuple)):
+		return [thaw_params(val) for val in value]
+	return value
+
+
+@lru_cache(maxsize=DRAW_MASK_CACHE_SIZE)
+def get_draw_mask(width: int, draw_operations: Tuple[Tuple[str, str], ...], use_numpy: bool, use_packed_bitmap: bool):
+	"""
+	Returns mask of modules drawn by operations (read only numpy matrix or
+	integer with one byte or one bit for each module) or None if everything is
+	drawn
+	"""
+	index = get_area_index(width)
+
+	def get_area_mask(area_name):
+		try:
+			area = index[area_name]
+		except KeyError:
+			raise ValueError(f"Unknown area {area_name}")
+		return area.bits if use_packed_bitmap else area.mask
+
+	mask = None
+	for operation, area_name in draw_operations:
+		if operation == '+' and area_name == 'all': # implicit operation, not needed
+			continue
+		area_mask = get_area_mask(area_name)
+		if operation == '+':
+			mask = area_mask if mask is None else mask | area_mask
+		else:
+			mask = (get_area_mask('all') if mask is None else mask) & ~area_mask
+	if mask is None:
+		return None
+	if use_numpy:
+		# read only, created from bytes
+		numpy = get_numpy()
+		return numpy.frombuffer(mask.to_bytes(width * width, 'big'), dtype=numpy.uint8).reshape(width, width)
+	return mask
+
+
+@lru_cache(maxsize=None)
+def get_numpy():
+	"""
+	Returns numpy module, it's imported on first call
+	"""
+	import numpy
+	return numpy
+
+
 class ReportlabImageBase(qrcode.image.base.BaseImage):
 	PARAMS = {
 		'size': Transforms.to_length,
-		'padding': None,
-		'fg': None,
-		'bg': None,
+		'padding': Transforms.to_padding,
+		'fg': Transforms.to_color,
+		'bg': Transforms.to_color,
 		'fg_alpha': Transforms.to_float,
 		'bg_alpha': Transforms.to_float,
 		'x': Transforms.to_length,
@@ -156,8 +748,12 @@ class ReportlabImageBase(qrcode.image.base.BaseImage):
 		'radius': Transforms.to_float,
 		'enhanced_path': Transforms.to_bool,
 		'hole': Transforms.to_area,
+		'draw_mode': Transforms.to_draw_mode,
 	}
-	DRAW_STATE_PROPERTIES = ['bitmap', 'fg', 'fg_alpha', 'enhanced_path', 'hole', 'radius']
+	DRAW_STATE_PROPERTIES = ['bitmap', 'fg', 'fg_alpha', 'enhanced_path', 'hole', 'radius', 'draw_mode']
+
+	needs_drawrect = False
+	needs_processing = True
 
 	size = toLength('5cm')
 	padding = '2.5'
@@ -173,13 +769,21 @@ class ReportlabImageBase(qrcode.image.base.BaseImage):
 	mask = False
 	enhanced_path = None
 	radius = 0
-	hole = []
+	draw_mode = 'path'
+	hole = ()
 	draw_parts = None
-	draw_state_stack = []
+	draw_state_stack = None
+	part_segments = None
+	alpha_states = None
+	use_numpy = NUMPY_AVAILABLE
+	use_packed_bitmap = False
+	use_fast_path = True
 
 	def __init__(self, *args, **kwargs):
+		# drawing state must not be shared between instances (threads)
+		self.draw_state_stack = []
 		super().__init__(*args, **kwargs)
-		self.bitmap = array.array('B', [1 if self.invert else 0] * self.width * self.width)
+		self.load_bitmap(bytes(self.width * self.width))
 		if isinstance(self.padding, str) and '%' in self.padding:
 			self.padding = float(self.padding[:-1]) * self.size / 100
 		else:
@@ -194,16 +798,75 @@ class ReportlabImageBase(qrcode.image.base.BaseImage):
 		if not self.draw_parts:
 			self.draw_parts = [{'draw': [('+', 'all')]}]
 
+	@classmethod
+	def from_segments(cls, width: int, part_segments: List[List[List[Tuple[int, int]]]], modules: bytes = None) -> 'ReportlabImageBase':
+		"""
+		Create image from already traced segments, modules (in format of
+		get_modules_bitmap) are loaded only if they are not None
+		"""
+		img = cls(0, width, 1, qrcode_modules=None)
+		if modules is not None:
+			img.load_modules_bitmap(modules)
+			img.clear_area()
+		img.part_segments = part_segments
+		return img
+
 	def drawrect(self, row: int, col: int):
 		self.bitmap_set((col, row), 0 if self.invert else 1)
 
+	def process(self):
+		self.load_modules()
+
+	def load_modules(self):
+		"""
+		Fill bitmap from qrcode modules in one bulk copy
+		"""
+		self.load_bitmap(self.get_modules_bitmap())
+
+	def get_modules_bitmap(self) -> bytes:
+		"""
+		Returns qrcode modules as bytes of 0 and 1 in row order
+		"""
+		return bytes(itertools.chain.from_iterable(self.modules))
+
+	def load_modules_bitmap(self, modules: bytes):
+		"""
+		Set modules (rows of 0 and 1 instead of bools) and bitmap from bytes
+		returned by get_modules_bitmap
+		"""
+		self.modules = [list(modules[row:row + self.width]) for row in range(0, len(modules), self.width)]
+		self.load_bitmap(modules)
+
+	def load_bitmap(self, bitmap: bytes):
+		"""
+		Fill bitmap from modules returned by get_modules_bitmap
+		"""
+		if self.invert:
+			bitmap = bitmap.translate(INVERT_TABLE)
+		self.bitmap = PackedBitmap.from_bytes(bitmap) if self.use_packed_bitmap else array.array('B', bitmap)
+
+	def numpy_enabled(self) -> bool:
+		return NUMPY_AVAILABLE and self.use_numpy and not self.use_packed_bitmap
+
+	def bitmap_matrix(self):
+		"""
+		Returns writable numpy view of bitmap with shape (rows, cols)
+		"""
+		numpy = get_numpy()
+		return numpy.frombuffer(self.bitmap, dtype=numpy.uint8).reshape(self.width, self.width)
+
 	def save(self, stream: Canvas):
+		add_count('saves')
 		if not self.mask:
 			stream.saveState()
 
 		a0, b0, c0, d0, e0, f0 = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0) # current matrix
 
-		self.clear_area()
+		part_segments = self.part_segments
+		if part_segments is None:
+			# segments are traced lazily while path is written
+			self.clear_area()
+			part_segments = [None] * len(self.draw_parts)
 
 		def transform(a, b, c, d, e, f):
 			nonlocal a0, b0, c0, d0, e0, f0
@@ -227,36 +890,21 @@ class ReportlabImageBase(qrcode.image.base.BaseImage):
 			transform(1.0, 0.0, 0.0, -1.0, self.x, self.y + self.size)
 
 			if not self.mask:
-				self.draw_background(stream)
+				with measure_stage('emit'):
+					self.draw_background(stream)
 
 			# Set transform matrix
 			scale = (self.size - (self.padding * 2.0)) / self.width
 			transform(scale, 0.0, 0.0, scale, self.padding, self.padding)
 
-			for part in self.draw_parts:
-				self.begin_part(part)
-
-				if not self.mask:
-					# Set foreground
-					stream.setFillColor(self.fg)
-					stream.setFillAlpha(self.fg_alpha)
-
-				p = stream.beginPath()
-				if self.negative:
-					pad = self.padding / scale
-					p.moveTo(-pad, -pad)
-					p.lineTo(self.width + pad, -pad)
-					p.lineTo(self.width + pad, self.width + pad)
-					p.lineTo(-pad, self.width + pad)
-					p.close()
-				if self.radius == 0:
-					p = self.draw_code(p)
-				else:
-					p = self.draw_rounded_code(p)
-				if self.mask:
-					stream.clipPath(p, stroke=0, fill=1, fillMode=FILL_EVEN_ODD)
-				else:
-					stream.drawPath(p, stroke=0, fill=1, fillMode=FILL_EVEN_ODD)
+			for part, segments in zip(self.draw_parts, part_segments):
+				self.begin_part(part, mask=False)
+				if segments is None:
+					# stages can't be measured separately if tracing is lazy
+					segments = self.trace_part(part['draw'], lazy=current_stats.get() is None)
+
+				with measure_stage('emit'):
+					self.draw_part(stream, segments, scale)
 
 				self.finish_part()
 		finally:
@@ -266,31 +914,115 @@ class ReportlabImageBase(qrcode.image.base.BaseImage):
 			else:
 				stream.restoreState()
 
+	def draw_part(self, stream: Canvas, segments, scale: float):
+		"""
+		Write path of current draw part to stream
+		"""
+		if not self.mask:
+			# Set foreground
+			stream.setFillColor(self.fg)
+			self.set_fill_alpha(stream, self.fg_alpha)
+
+		if self.fast_path_enabled(stream):
+			self.write_path_code(stream, segments, self.padding / scale if self.negative else None)
+			return
+
+		p = stream.beginPath()
+		if self.negative:
+			pad = self.padding / scale
+			p.moveTo(-pad, -pad)
+			p.lineTo(self.width + pad, -pad)
+			p.lineTo(self.width + pad, self.width + pad)
+			p.lineTo(-pad, self.width + pad)
+			p.close()
+		if self.draw_mode == 'rects':
+			p = self.draw_rects(p, segments)
+		elif self.radius == 0:
+			p = self.draw_code(p, segments)
+		else:
+			p = self.draw_rounded_code(p, segments)
+		# path objects of adapters (other formats than PDF) don't have code
+		add_count('path_operators', len(getattr(p, '_code', [])[1:]))
+		if self.mask:
+			stream.clipPath(p, stroke=0, fill=1, fillMode=FILL_EVEN_ODD)
+		else:
+			stream.drawPath(p, stroke=0, fill=1, fillMode=FILL_EVEN_ODD)
+
+	def get_part_segments(self) -> List[List[List[Tuple[int, int]]]]:
+		"""
+		Returns list of segments for each draw part, or list of rectangles
+		for parts with rects draw mode
+		"""
+		if self.part_segments is None:
+			self.clear_area()
+			part_segments = []
+			for part in self.draw_parts:
+				self.begin_part(part, mask=False)
+				part_segments.append(self.trace_part(part['draw']))
+				self.finish_part()
+			self.part_segments = part_segments
+		return self.part_segments
+
+	def trace_part(self, draw_operations: List[Tuple[str, str]], lazy: bool = False):
+		"""
+		Returns rectangles or segments of part (generator if lazy is True),
+		must be called between begin_part and finish_part
+		"""
+		bitmap = self.get_part_bitmap(draw_operations)
+		if lazy and self.draw_mode != 'rects':
+			return self.iter_segments(bitmap)
+		with measure_stage('trace'):
+			segments = self.get_rects(bitmap) if self.draw_mode == 'rects' else self.get_segments(bitmap)
+		add_count('segments', len(segments))
+		return segments
+
 	def draw_background(self, stream: Canvas):
 		"""
 		Draw rectangle on background if is not transparent
 		"""
 		if self.bg is not None:
 			stream.setFillColor(self.bg)
-			stream.setFillAlpha(self.bg_alpha)
+			self.set_fill_alpha(stream, self.bg_alpha)
 			stream.rect(0, 0, self.size, self.size, fill=1, stroke=0)
 
-	def draw_code(self, path):
+	def set_fill_alpha(self, stream: Canvas, alpha: float):
+		"""
+		Set alpha using canvas or using own graphics states if alpha_states
+		is dictionary (alpha to state name) collecting states of form
+		"""
+		if self.alpha_states is None:
+			stream.setFillAlpha(alpha)
+			return
+		# form doesn't inherit alpha from canvas, so it's set always
+		name = self.alpha_states.get(alpha)
+		if name is None:
+			name = self.alpha_states[alpha] = f'QRa{len(self.alpha_states)}'
+		stream.addLiteral(f'/{name} gs')
+
+	def draw_code(self, path, segments=None):
 		"""
 		Draw QR code
 		"""
-		for segment in self.get_segments():
+		for segment in self.iter_segments() if segments is None else segments:
 			path.moveTo(segment[0][0], segment[0][1])
 			for coords in segment[1:-1]:
 				path.lineTo(coords[0], coords[1])
 			path.close()
 		return path
 
-	def draw_rounded_code(self, path):
+	def draw_rects(self, path, rects=None):
+		"""
+		Draw QR code as rectangles
+		"""
+		for x, y, w, h in self.get_rects() if rects is None else rects:
+			path.rect(x, y, w, h)
+		return path
+
+	def draw_rounded_code(self, path, segments=None):
 		"""
 		Draw QR code using rounded paths
 		"""
-		for segment in self.get_segments():
+		for segment in self.iter_segments() if segments is None else segments:
 			segment = segment[:-1]
 			for i in range(0, len(segment)):
 				coords = segment[i]
@@ -311,6 +1043,80 @@ class ReportlabImageBase(qrcode.image.base.BaseImage):
 			path.close()
 		return path
 
+	def fast_path_enabled(self, stream) -> bool:
+		return self.use_fast_path and isinstance(stream, Canvas)
+
+	def write_path_code(self, stream: Canvas, segments, pad=None):
+		"""
+		Write whole path as single string of PDF operators
+
+		Output is same as output of reportlab path object (draw_code and
+		draw_rounded_code), but without method call for each operator.
+		"""
+		code = self.get_path_code(segments, pad)
+		fill = PATH_OPS[0, 1, FILL_EVEN_ODD]
+		if self.mask:
+			stream.addLiteral(f'{code} W* {fill}')
+		else:
+			stream.addLiteral(code)
+			stream.addLiteral(fill)
+
+	def get_path_code(self, segments, pad=None) -> str:
+		"""
+		Returns PDF path operators of segments in module coordinates
+		"""
+		# path object starts with no-op operator
+		code = ['n']
+		append = code.append
+		if pad is not None:
+			low = fp_str(-pad)
+			high = fp_str(self.width + pad)
+			code += [f'{low} {low} m', f'{high} {low} l', f'{high} {high} l', f'{low} {high} l', 'h']
+
+		if self.draw_mode == 'rects':
+			code += [f'{x} {y} {w} {h} re' for x, y, w, h in segments]
+			return self.__join_path_code(code)
+
+		if self.radius == 0:
+			for segment in segments:
+				x, y = segment[0]
+				append(f'{x} {y} m')
+				for x, y in segment[1:-1]:
+					append(f'{x} {y} l')
+				append('h')
+			return self.__join_path_code(code)
+
+		# numbers are formatted using fp_str, which is slow, so results are reused
+		numbers = {}
+
+		def fmt(*values):
+			result = []
+			for value in values:
+				text = numbers.get(value)
+				if text is None:
+					text = numbers[value] = fp_str(value)
+				result.append(text)
+			return ' '.join(result)
+
+		c = 0.45 # 1 - (4/3)*tan(pi/8)
+		for segment in segments:
+			segment = segment[:-1]
+			prev_coords = segment[-1]
+			for i, coords in enumerate(segment):
+				next_coords = segment[(i + 1) % len(segment)]
+				prev_dir = self.__calc_round_direction(prev_coords, coords, self.radius)
+				next_dir = self.__calc_round_direction(next_coords, coords, self.radius)
+				x, y = coords
+				append(fmt(x + prev_dir[0], y + prev_dir[1]) + (' m' if i == 0 else ' l'))
+				append(fmt(
+					x + prev_dir[0] * c, y + prev_dir[1] * c,
+					x + next_dir[0] * c, y + next_dir[1] * c,
+					x + next_dir[0], y + next_dir[1],
+				) + ' c')
+				prev_coords = coords
+			append('h')
+		return self.__join_path_code(code)
+
 	def addr(self, coords: Tuple[int, int]) -> int:
 		"""
 		Get index to bitmap
@@ -347,16 +1153,36 @@ class ReportlabImageBase(qrcode.image.base.BaseImage):
 		addr = self.addr(coords)
 		self.bitmap[addr] = 0 if self.bitmap[addr] else 1
 
-	def get_segments(self) -> List[List[Tuple[int, int]]]:
+	def get_segments(self, bitmap=None) -> List[List[Tuple[int, int]]]:
 		"""
-		Return list of segments (vector shapes)
+		Return list of segments (vector shapes) of bitmap or image bitmap
 		"""
-		segments = []
-		segment = self.__consume_segment()
-		while segment:
-			segments.append(segment)
-			segment = self.__consume_segment()
-		return segments
+		return list(self.iter_segments(bitmap))
+
+	def get_rects(self, bitmap=None) -> List[Tuple[int, int, int, int]]:
+		"""
+		Return list of rectangles (x, y, w, h) covering bitmap or image bitmap
+
+		Runs of modules in row are merged with runs at same position in
+		following rows.
+		"""
+		width = self.width
+		bitmap = bytes(self.bitmap if bitmap is None else bitmap)
+		rects = []
+		# start rows of runs by (x, w)
+		open_runs = {}
+		for row in range(width + 1):
+			runs = {}
+			if row < width:
+				offset = row * width
+				for match in RUN_PATTERN.finditer(bitmap, offset, offset + width):
+					run = (match.start() - offset, match.end() - match.start())
+					runs[run] = open_runs.pop(run, row)
+			# runs not continuing on this row are finished
+			rects += [(x, y, w, row - y) for (x, w), y in open_runs.items()]
+			open_runs = runs
+		rects.sort(key=operator.itemgetter(1, 0))
+		return rects
 
 	def convert_absolute_to_relative(self, coordinate: Length) -> Length:
 		if coordinate.kind == LENGTH_ABSOLUTE:
@@ -382,166 +1208,168 @@ class ReportlabImageBase(qrcode.image.base.BaseImage):
 		return (x_px, y_px, w_px, h_px)
 
 	def clear_area(self):
-		for hole in self.hole:
-			for x in range(hole[0], hole[0] + hole[2]):
-				for y in range(hole[1], hole[1] + hole[3]):
-					self.bitmap_set((x, y), 0)
+		if not self.hole:
+			return
+		with measure_stage('mask'):
+			# holes outside of code would wrap to next row or raise error
+			holes = clip_rectangles(self.width, self.hole)
+			if self.use_packed_bitmap:
+				self.bitmap.value &= ~get_area_bits(self.width, holes)
+			elif self.numpy_enabled():
+				matrix = self.bitmap_matrix()
+				for x, y, w, h in holes:
+					matrix[y:y + h, x:x + w] = 0
+			else:
+				for hole in holes:
+					self.fill_area(self.bitmap, hole, 0)
 
-	def __consume_segment(self) -> List[Tuple[int, int]]:
+	def fill_area(self, bitmap, area: Tuple[int, int, int, int], value: int):
 		"""
-		Returns segment of qr image as path (pairs of x, y coordinates)
+		Fill rectangular area of flat bitmap row by row
 		"""
+		x, y, w, h = area
+		bitmap = memoryview(bitmap)
+		line = bytes([value]) * w
+		for row in range(y, y + h):
+			addr = row * self.width + x
+			bitmap[addr:addr + w] = line
 
-		line_intersections = [[] for __ in range(self.width)]
-
-		try:
-			# Find first pixel
-			coords = self.coord(self.bitmap.index(1))
-		except ValueError:
-			# Or no pixels left
-			return
+	def get_edges(self, bitmap=None) -> Tuple[bytearray, bytearray]:
+		"""
+		Returns boundary edges of bitmap
 
-		def move():
-			nonlocal coords
-			step = DIRECTION[direction]
-
-			# Record intersection
-			if step[1]: # Vertical move
-				line = coords[1]
-				if step[1] == -1:
-					line -= 1
-				line_intersections[line].append(coords[0])
-
-			# Step
-			coords += step
-
-		# Accumulated path
-		path = []
-		# Begin of line
-		path.append(tuple(coords))
-		# Default direction to right
-		direction = 0
-		# Default clockwiese direction
-		clockwiese = 1
-
-		# Move to right
-		move()
-
-		# From shape begin to end
-		while coords != path[0]:
-			# Trun left
-			val = self.bitmap_get(coords + DIRECTION_TURNS_CHECKS[(direction - max(0, clockwiese)) % 4])
-			if val:
-				if self.enhanced_path:
-					# Detect intersection pattern and change direction
-					if not self.bitmap_get(coords + DIRECTION_TURNS_CHECKS[(direction + min(0, clockwiese)) % 4]):
-						move()
+		Edges are indexed by vertex address row * (width + 1) + col. First
+		array contains horizontal edges going right from vertex, second array
+		vertical edges going down from vertex.
+		"""
+		width = self.width
+		stride = width + 1
+		horizontal = bytearray(stride * stride)
+		vertical = bytearray(stride * stride)
+		bitmap = bytes(self.bitmap if bitmap is None else bitmap)
+		previous_line = 0
+		for row in range(stride):
+			line = int.from_bytes(bitmap[row * width:(row + 1) * width], 'big')
+			addr = row * stride
+			# pixels above and below edge differ
+			horizontal[addr:addr + width] = (previous_line ^ line).to_bytes(width, 'big')
+			if row < width:
+				# pixels on left and right side of edge differ
+				vertical[addr:addr + stride] = ((line << 8) ^ line).to_bytes(stride, 'big')
+			previous_line = line
+		return horizontal, vertical
+
+	def iter_segments(self, bitmap=None) -> Iterator[List[Tuple[int, int]]]:
+		"""
+		Yields segments of bitmap or image bitmap as paths (pairs of x, y
+		coordinates), each segment is yielded as soon as it's traced
+
+		Shapes are traced along boundary edges, which are removed after
+		tracing. Removing shape edges is equivalent to inverting of shape area,
+		so next shape starts at first remaining edge on top of pixel. Search
+		continues from start of previous shape and every edge is visited only
+		once.
+		"""
+		stride = self.width + 1
+		horizontal, vertical = self.get_edges(bitmap)
+		edges = (horizontal, vertical, horizontal, vertical)
+		# Address offsets of edge leaving vertex in direction
+		edge_offsets = (0, 0, -1, -stride)
+		# Address offsets of next vertex in direction
+		steps = (1, stride, -1, -stride)
+
+		start = horizontal.find(1)
+		while start != -1:
+			consumed = ([], [])
+			# Begin of line
+			path = [(start % stride, start // stride)]
+			# Default direction to right
+			direction = 0
+			# Default clockwiese direction
+			clockwiese = 1
+
+			# Move to right
+			consumed[0].append(start)
+			vertex = start + 1
+
+			# From shape begin to end
+			while vertex != start:
+				left = (direction - clockwiese) % 4
+				right = (direction + clockwiese) % 4
+				if edges[left][vertex + edge_offsets[left]]:
+					if self.enhanced_path and edges[right][vertex + edge_offsets[right]]:
+						# Intersection pattern, change direction and continue straight
 						clockwiese = -clockwiese
-						continue;
-				path.append(tuple(coords))
-				direction = (direction - clockwiese) % 4
-				move()
-				continue
-
-			# Straight
-			val = self.bitmap_get(coords + DIRECTION_TURNS_CHECKS[(direction + min(0, clockwiese)) % 4])
-			if val:
-				move()
-				continue
-
-			# Trun right
-			path.append(tuple(coords))
-			direction = (direction + clockwiese) % 4
-			move()
-
-		path.append(tuple(coords))
-
-		# Remove shape from bitmap
-		for row, line in enumerate(line_intersections):
-			line = sorted(line)
-			for start, end in zip(line[::2], line[1::2]):
-				for col in range(start, end):
-					self.bitmap_invert((col, row))
-
-		return path
-
-	def begin_part(self, definition: dict):
-		# save drawing state and mask bitmap
-		self.draw_state_stack.append({prop: deepcopy(getattr(self, prop)) for prop in self.DRAW_STATE_PROPERTIES})
+					else:
+						# Trun left
+						path.append((vertex % stride, vertex // stride))
+						direction = left
+				elif edges[right][vertex + edge_offsets[right]]:
+					# Trun right
+					path.append((vertex % stride, vertex // stride))
+					direction = right
+				consumed[direction & 1].append(vertex + edge_offsets[direction])
+				vertex += steps[direction]
+
+			path.append(path[0])
+			yield path
+
+			# Remove shape edges
+			for addr in consumed[0]:
+				horizontal[addr] = 0
+			for addr in consumed[1]:
+				vertical[addr] = 0
+
+			start = horizontal.find(1, start + 1)
+
+	def begin_part(self, definition: dict, mask: bool = True):
+		# save drawing state, values are replaced, not modified, so copy is not needed
+		self.draw_state_stack.append({prop: getattr(self, prop) for prop in self.DRAW_STATE_PROPERTIES})
 		for prop, value in definition.items():
 			if prop in self.DRAW_STATE_PROPERTIES:
 				setattr(self, prop, value)
 
-		draw_mask = definition['draw']
-		mask = None
-		for operation, area in draw_mask:
-			if operation == '+' and area == 'all': # implicit operation, not needed
-				continue
+		if mask:
+			bitmap = self.get_part_bitmap(definition['draw'])
+			self.bitmap = bitmap if self.use_packed_bitmap else array.array('B', bitmap)
+
+	def get_part_bitmap(self, draw_operations: List[Tuple[str, str]]):
+		"""
+		Returns bitmap of modules drawn by part
+		"""
+		with measure_stage('mask'):
+			mask = self.get_draw_mask(draw_operations)
+			if self.use_packed_bitmap:
+				return PackedBitmap(self.bitmap.size, self.bitmap.value if mask is None else self.bitmap.value & mask)
 			if mask is None:
-				base_value = 0 if operation == '+' else 1
-				mask = array.array('B', [base_value] * self.width * self.width)
-			if operation == '+':
-				def mask_action(x, y):
-					mask[x + y*self.width] = mask[x + y*self.width] or 1
-			else:
-				def mask_action(x, y):
-					mask[x + y*self.width] = 0
-			for area in self.get_fragment_area(area):
-				for x in range(area[0], area[0] + area[2]):
-					for y in range(area[1], area[1] + area[3]):
-						mask_action(x, y)
-		if mask is not None:
-			self.bitmap = array.array('B', [bit * mask for bit, mask in zip(self.bitmap, mask)])
+				return self.bitmap
+			if self.numpy_enabled():
+				return (self.bitmap_matrix() & mask).tobytes()
+			return (int.from_bytes(self.bitmap, 'big') & mask).to_bytes(len(self.bitmap), 'big')
+
+	def get_draw_mask(self, draw_operations: List[Tuple[str, str]]):
+		"""
+		Returns mask of drawn pixels (read only numpy matrix or integer with one
+		byte or one bit for each pixel) or None if everything is drawn
+
+		Masks are cached for recently used code versions and draw operations.
+		"""
+		return get_draw_mask(self.width, freeze_value(draw_operations), self.numpy_enabled(), self.use_packed_bitmap)
 
 	def get_version(self) -> int:
 		return (self.width - 21) // 4 + 1
 
 	def get_align_positions(self) -> List[Tuple[int, int]]:
-		positions = []
-		version = self.get_version()
-		for x in ALIGN_POSITION_TABLE[version - 1]:
-			for y in ALIGN_POSITION_TABLE[version - 1]:
-				# exclude eyes
-				if x < 8 and y < 8 or x > self.width - 8 and y < 8 or x < 8 and y > self.width - 8:
-					continue
-				positions.append((x, y))
-		return positions
+		return get_align_positions(self.width)
+
+	def get_area(self, area_name: str) -> Area:
+		try:
+			return get_area_index(self.width)[area_name]
+		except KeyError:
+			raise ValueError(f"Unknown area {area_name}")
 
 	def get_fragment_area(self, area_name: str) -> List[Tuple[int, int, int, int]]:
-		if area_name == 'all':
-			return [(0, 0, self.width, self.width)]
-		elif area_name == 'eye1':
-			return [(0, 0, 7, 7)]
-		elif area_name == 'eye2':
-			return [(self.width - 7, 0, 7, 7)]
-		elif area_name == 'eye3':
-			return [(0, self.width - 7, 7, 7)]
-		elif area_name == 'eyes':
-			return self.get_fragment_area('eye1') + self.get_fragment_area('eye2') + self.get_fragment_area('eye3')
-		elif area_name == 'eyepupil1':
-			return [(2, 2, 3, 3)]
-		elif area_name == 'eyepupil2':
-			return [(self.width - 5, 2, 3, 3)]
-		elif area_name == 'eyepupil3':
-			return [(2, self.width - 5, 3, 3)]
-		elif area_name == 'eyepupils':
-			return self.get_fragment_area('eyepupil1') + self.get_fragment_area('eyepupil2') + self.get_fragment_area('eyepupil3')
-		elif area_name == 'eyeball1':
-			return [(0, 0, 7, 1), (0, 6, 7, 1), (0, 1, 1, 5), (6, 1, 1, 5)]
-		elif area_name == 'eyeball2':
-			return [(self.width - 7, 0, 7, 1), (self.width - 7, 6, 7, 1), (self.width - 7, 1, 1, 5), (self.width - 1, 1, 1, 5)]
-		elif area_name == 'eyeball3':
-			return [(0, self.width - 7, 7, 1), (0, self.width - 1, 7, 1), (0, self.width - 6, 1, 5), (6, self.width - 6, 1, 5)]
-		elif area_name == 'eyeballs':
-			return self.get_fragment_area('eyeball1') + self.get_fragment_area('eyeball2') + self.get_fragment_area('eyeball3')
-		elif area_name == 'align':
-			return [(x - 2, y - 2, 5, 5) for x, y in self.get_align_positions()]
-		elif area_name == 'alignpupils':
-			return [(x, y, 1, 1) for x, y in self.get_align_positions()]
-		elif area_name == 'alignballs':
-			patterns = [[(x - 2, y - 2, 5, 1), (x - 2, y + 2, 5, 1), (x - 2, y - 1, 1, 3), (x + 2, y - 1, 1, 3)] for x, y in self.get_align_positions()]
-			return list(itertools.chain(*patterns))
-		raise ValueError(f"Unknown area {area_name}")
+		return list(self.get_area(area_name).rectangles)
 
 	def finish_part(self):
 		# restore drawing state
@@ -549,6 +1377,11 @@ class ReportlabImageBase(qrcode.image.base.BaseImage):
 		for prop, value in state.items():
 			setattr(self, prop, value)
 
+	def __join_path_code(self, code: List[str]) -> str:
+		# first operator is no-op
+		add_count('path_operators', len(code) - 1)
+		return ' '.join(code) if len(code) > 1 else ''
+
 	def __calc_round_direction(self, src, dst, radius):
 		return [min(max((s - d) * 0.5, -radius), radius) for s, d in zip(src, dst)]
 
@@ -632,15 +1465,9 @@ def clean_params(params, clean_type=PARAMS_GLOBAL):
 	parse_color(params, 'bg')
 
 
-def parse_params_string(params):
+def split_params_string(params: str) -> Tuple[str, str, str]:
 	"""
-	Parses params string in form:
-
-	key=value,key2=value2;(text|base64);content
-
-	For example:
-
-	size=5cm,fg=#ff0000,bg=#ffffff,version=1,error_correction=M,padding=5%;text;text to encode
+	Split params string to parameters, format and content
 	"""
 	try:
 		parsed_params, fmt, text = params.split(';', 2)
@@ -648,7 +1475,13 @@ def parse_params_string(params):
 		raise ValueError("Wrong format, expected parametrs;format;content")
 	if fmt not in ('text', 'base64'):
 		raise ValueError("Unknown format '%s', supprted are text or base64" % fmt)
+	return parsed_params, fmt, text
+
 
+def parse_style_string(parsed_params: str) -> dict:
+	"""
+	Parses parameters in form key=value,key2=value2 without validation
+	"""
 	params = DEFAULT_PARAMS.copy()
 
 	# allow draw specific parts with different settings
@@ -667,38 +1500,385 @@ def parse_params_string(params):
 		except ValueError:
 			raise ValueError("Wrong format of parameters '%s', expected key=value pairs delimited by ',' character" % parsed_params)
 
-	clean_params(params)
-	for part in params['draw_parts']:
-		clean_params(part, PARAMS_PART)
+	return params
+
 
+def decode_text(fmt: str, text: str) -> bytes:
 	text = text.encode('utf-8')
 	if fmt == 'base64':
 		try:
 			text = b64decode(text)
 		except Exception as e:
 			raise ValueError("Wrong base64 '%s': %s" % (text.decode('utf-8'), e))
+	return text
 
-	return params, text
 
+def parse_params_string(params):
+	"""
+	Parses params string in form:
 
-def build_qrcode(params: dict, text: str) -> ReportlabImageBase:
-	factory_kwargs = {key: value for key, value in params.items() if key not in QR_PARAMS}
-	qr_kwargs = {key: value for key, value in params.items() if key in QR_PARAMS}
-	qr = qrcode.QRCode(image_factory=reportlab_image_factory(**factory_kwargs), border=0, **qr_kwargs)
-	qr.add_data(text)
-	return qr.make_image()
+	key=value,key2=value2;(text|base64);content
 
+	For example:
+
+	size=5cm,fg=#ff0000,bg=#ffffff,version=1,error_correction=M,padding=5%;text;text to encode
+	"""
+	parsed_params, fmt, text = split_params_string(params)
+	params = parse_style_string(parsed_params)
 
-def qr_draw(canvas, text, **kwargs):
-	params = DEFAULT_PARAMS.copy()
-	params.update(**kwargs)
 	clean_params(params)
+	for part in params['draw_parts']:
+		clean_params(part, PARAMS_PART)
+
+	return params, decode_text(fmt, text)
+
+
+def get_cache(cache: Union[bool, GeometryCache, None]) -> Union[GeometryCache, None]:
+	if isinstance(cache, GeometryCache):
+		return cache
+	return geometry_cache if Transforms.to_bool(cache) else None
+
+
+def get_matrix_cache(matrix_cache: Union[str, os.PathLike, MatrixCache, None]) -> Union[MatrixCache, None]:
+	"""
+	Returns matrix cache, directory is converted to cache shared in process
+	"""
+	if matrix_cache is None or isinstance(matrix_cache, MatrixCache):
+		return matrix_cache
+	directory = os.path.abspath(matrix_cache)
+	with matrix_caches_lock:
+		cache = matrix_caches.get(directory)
+		if cache is None:
+			cache = MatrixCache(directory)
+			matrix_caches[directory] = cache
+	return cache
+
+
+def get_image_factory(params: dict) -> Tuple[type, dict]:
+	"""
+	Returns image class and arguments for qrcode.QRCode
+	"""
+	factory_kwargs = {key: deepcopy(value) for key, value in params.items() if key not in QR_PARAMS}
+	qr_kwargs = {key: value for key, value in params.items() if key in QR_PARAMS}
+	return reportlab_image_factory(**factory_kwargs), qr_kwargs
+
+
+@dataclass(frozen=True)
+class QRStyle:
+	"""
+	Validated style with prepared image class
+
+	Style should be created using QRStyle.from_kwargs(**params) or
+	QRStyle.from_string('key=value,key2=value2'). Styles created from string
+	are cached. Styles compiled from same parameters are equal and can be used
+	as dictionary keys.
+	"""
+
+	key: tuple
+	raw_params: Mapping = field(compare=False, repr=False)
+	params: Mapping = field(compare=False, repr=False)
+	options: Mapping = field(compare=False, repr=False)
+	image_factory: type = field(compare=False, repr=False)
+	qr_kwargs: Mapping = field(compare=False, repr=False)
+	geometry_key: tuple = field(compare=False, repr=False)
+	form_key: tuple = field(compare=False, repr=False)
+
+	@classmethod
+	def from_params(cls, raw_params: dict, params: dict) -> 'QRStyle':
+		"""
+		Create style from raw and cleaned parameters, nested values are
+		copied, so style can't be changed using arguments
+		"""
+		params = thaw_params(params)
+		options = {key: params.pop(key) for key in DRAW_OPTIONS if key in params}
+		image_factory, qr_kwargs = get_image_factory(params)
+		return cls(
+			key=freeze_value((params, options)),
+			raw_params=freeze_params(raw_params),
+			params=freeze_params(params),
+			options=freeze_params(options),
+			image_factory=image_factory,
+			qr_kwargs=MappingProxyType(qr_kwargs),
+			geometry_key=GeometryCache.get_params_key(params),
+			form_key=freeze_value({key: value for key, value in params.items() if key not in ('x', 'y')}),
+		)
+
+	@classmethod
+	def from_kwargs(cls, **kwargs) -> 'QRStyle':
+		params = DEFAULT_PARAMS.copy()
+		params.update(**kwargs)
+		raw_params = params.copy()
+		clean_params(params)
+		return cls.from_params(raw_params, params)
+
+	@staticmethod
+	@lru_cache(maxsize=STYLE_CACHE_SIZE)
+	def from_string(parsed_params: str) -> 'QRStyle':
+		raw_params = parse_style_string(parsed_params)
+		params = deepcopy(raw_params)
+		clean_params(params)
+		for part in params['draw_parts']:
+			clean_params(part, PARAMS_PART)
+		return QRStyle.from_params(raw_params, params)
+
+	def replace(self, **kwargs) -> 'QRStyle':
+		"""
+		Returns new style with changed parameters
+		"""
+		return QRStyle.from_kwargs(**{**thaw_params(self.raw_params), **kwargs})
+
+	def __reduce__(self):
+		# image class is created dynamically, style is compiled again after unpickling
+		return (QRStyle.from_params, (thaw_params(self.raw_params), thaw_params({**self.params, **self.options})))
+
+
+def build_qrcode(params: Union[dict, QRStyle], text: str, cache: GeometryCache = None, matrix_cache: Union[str, MatrixCache] = None) -> ReportlabImageBase:
+	"""
+	Build image from cleaned parameters or style, traced segments are looked
+	up in cache or stored to cache if it's not None
+
+	Encoded modules are looked up in matrix_cache (instance of MatrixCache or
+	directory) before encoding.
+	"""
+	matrix_cache = get_matrix_cache(matrix_cache)
+	if isinstance(params, QRStyle):
+		return make_qrcode(params.image_factory, params.qr_kwargs, text, cache, params.geometry_key, matrix_cache)
+	image_factory, qr_kwargs = get_image_factory(params)
+	params_key = None if cache is None else GeometryCache.get_params_key(params)
+	return make_qrcode(image_factory, qr_kwargs, text, cache, params_key, matrix_cache)
+
+
+def make_qrcode(image_factory: type, qr_kwargs: dict, text: bytes, cache: GeometryCache = None, params_key: tuple = None, matrix_cache: MatrixCache = None) -> ReportlabImageBase:
+	"""
+	Build image using prepared image class
+	"""
+	add_count('codes')
+	if cache is not None:
+		key = (text, params_key)
+		geometry = cache.get(key)
+		add_count('geometry_cache_misses' if geometry is None else 'geometry_cache_hits')
+		if geometry is not None:
+			width, part_segments, __, modules = geometry
+			return image_factory.from_segments(width, part_segments, modules)
+	matrix = None
+	if matrix_cache is not None:
+		matrix_key = matrix_cache.get_key(qr_kwargs, text)
+		with measure_stage('matrix_cache'):
+			matrix = matrix_cache.get(matrix_key)
+		add_count('matrix_cache_misses' if matrix is None else 'matrix_cache_hits')
+	if matrix is None:
+		qr = qrcode.QRCode(image_factory=image_factory, border=0, **qr_kwargs)
+		qr.add_data(text)
+		with measure_stage('encode'):
+			qr.make()
+		with measure_stage('load'):
+			img = qr.make_image()
+		if matrix_cache is not None:
+			with measure_stage('matrix_cache'):
+				matrix_cache.put(matrix_key, img.width, img.get_modules_bitmap())
+	else:
+		width, modules = matrix
+		with measure_stage('load'):
+			img = image_factory(0, width, 1, qrcode_modules=None)
+			img.load_modules_bitmap(modules)
+	if cache is not None:
+		cache.put(key, img.width, img.get_part_segments(), img.get_modules_bitmap())
+	return img
+
+
+class QRGeometry:
+	"""
+	Traced code independent of canvas
+
+	Shapes of each draw part are stored as flat array of coordinates, x, y
+	pairs of segments (without closing point) with array of segment offsets,
+	or x, y, w, h of rectangles (offsets are None). Fill style is defined by
+	style. Geometry can be pickled (e.g. returned from process pool), cached
+	and drawn to canvas or canvas adapter without encoding and tracing.
+	"""
+
+	__slots__ = ('style', 'width', 'coords', 'offsets')
+
+	def __init__(self, style: QRStyle, width: int, coords: Tuple[array.array, ...], offsets: Tuple[Union[array.array, None], ...]):
+		self.style = style
+		self.width = width
+		self.coords = coords
+		self.offsets = offsets
+
+	@classmethod
+	def from_segments(cls, style: QRStyle, width: int, part_segments: List[List]) -> 'QRGeometry':
+		"""
+		Create geometry from segments or rectangles of draw parts
+		"""
+		coords = []
+		offsets = []
+		for segments in part_segments:
+			flat = array.array('B')
+			if segments and isinstance(segments[0], tuple): # rectangles
+				flat.extend(itertools.chain.from_iterable(segments))
+				offsets.append(None)
+			else:
+				segment_offsets = array.array('I', [0])
+				for segment in segments:
+					flat.extend(itertools.chain.from_iterable(segment[:-1]))
+					segment_offsets.append(len(flat) // 2)
+				offsets.append(segment_offsets)
+			coords.append(flat)
+		return cls(style, width, tuple(coords), tuple(offsets))
+
+	@property
+	def part_segments(self) -> List[List]:
+		"""
+		Returns segments or rectangles of draw parts in format of get_part_segments
+		"""
+		part_segments = []
+		for coords, offsets in zip(self.coords, self.offsets):
+			if offsets is None:
+				part_segments.append(list(zip(coords[0::4], coords[1::4], coords[2::4], coords[3::4])))
+				continue
+			points = list(zip(coords[0::2], coords[1::2]))
+			segments = []
+			for start, end in zip(offsets, offsets[1:]):
+				segment = points[start:end]
+				segment.append(segment[0])
+				segments.append(segment)
+			part_segments.append(segments)
+		return part_segments
+
+	def __eq__(self, other):
+		if not isinstance(other, QRGeometry):
+			return NotImplemented
+		return (self.style, self.width, self.coords, self.offsets) == (other.style, other.width, other.coords, other.offsets)
+
+	__hash__ = None
+
+	def __repr__(self):
+		return f'QRGeometry(style={self.style!r}, width={self.width})'
+
+	def get_image(self) -> ReportlabImageBase:
+		"""
+		Returns image with traced segments, which can be saved to any canvas
+		"""
+		return self.style.image_factory.from_segments(self.width, self.part_segments)
+
+	def iter_parts(self):
+		"""
+		Yields fill style (fg, fg_alpha, radius, draw_mode) and segments of
+		each draw part for custom backends
+		"""
+		img = self.get_image()
+		for part, segments in zip(img.draw_parts, img.part_segments):
+			img.begin_part(part, mask=False)
+			yield {'fg': img.fg, 'fg_alpha': img.fg_alpha, 'radius': img.radius, 'draw_mode': img.draw_mode}, segments
+			img.finish_part()
+
+	def draw(self, canvas: Canvas, x=None, y=None):
+		"""
+		Draw code to canvas, x and y overrides position from style
+		"""
+		img = self.get_image()
+		if x is not None:
+			img.x = Transforms.to_length(x)
+		if y is not None:
+			img.y = Transforms.to_length(y)
+		img.save(canvas)
+
+
+def build_geometry(style: QRStyle, text: bytes, cache=None, matrix_cache=None) -> QRGeometry:
+	"""
+	Encode and trace code to geometry
+	"""
+	img = build_qrcode(style, text, get_cache(cache), matrix_cache)
+	return QRGeometry.from_segments(style, img.width, img.get_part_segments())
+
+
+def draw_qrcode_form(canvas: Canvas, style: QRStyle, text: bytes, cache: GeometryCache = None, x=None, y=None, matrix_cache: MatrixCache = None):
+	"""
+	Draw code as form XObject
+
+	Form is created only once for each content and style (except position),
+	next calls only place existing form to new position.
+	"""
+	if Transforms.to_bool(style.params.get('mask')):
+		raise ValueError("Mask can't be rendered as form")
+	name = 'QR' + hashlib.sha1(repr((text, style.form_key)).encode('utf-8')).hexdigest()
+	if not canvas.hasForm(name):
+		img = build_qrcode(style, text, cache, matrix_cache)
+		img.x = 0
+		img.y = 0
+		img.alpha_states = {}
+		canvas.beginForm(name, 0, 0, img.size, img.size)
+		img.save(canvas)
+		# form resources don't contain graphics states (alpha) by default
+		resources = PDFResourceDictionary()
+		resources.basicFonts()
+		resources.ExtGState = {state: PDFDictionary({'ca': alpha}) for alpha, state in img.alpha_states.items()}
+		canvas.endForm(Resources=resources)
+	canvas.saveState()
+	canvas.translate(
+		Transforms.to_length(style.params.get('x', 0) if x is None else x),
+		Transforms.to_length(style.params.get('y', 0) if y is None else y)
+	)
+	canvas.doForm(name)
+	canvas.restoreState()
+
+
+def draw_qrcode(canvas: Canvas, style: QRStyle, text: bytes, cache=None, form=False, x=None, y=None, matrix_cache=None):
+	"""
+	Draw code using style, x and y overrides position from style
+	"""
+	cache = get_cache(cache)
+	matrix_cache = get_matrix_cache(matrix_cache)
+	if Transforms.to_bool(form):
+		draw_qrcode_form(canvas, style, text, cache, x, y, matrix_cache)
+	else:
+		img = build_qrcode(style, text, cache, matrix_cache)
+		if x is not None:
+			img.x = Transforms.to_length(x)
+		if y is not None:
+			img.y = Transforms.to_length(y)
+		img.save(canvas)
+
+
+def get_style(style: Union[QRStyle, None], kwargs: dict) -> QRStyle:
+	"""
+	Returns style from keyword arguments if style is not set
+	"""
+	if style is None:
+		return QRStyle.from_kwargs(**kwargs)
+	if kwargs:
+		raise ValueError("Parameters %s can't be combined with style, use style.replace()" % ', '.join(kwargs))
+	return style
+
+
+def qr_draw(canvas, text, cache=None, form=False, style=None, matrix_cache=None, **kwargs):
+	"""
+	Draw QR code to canvas
+
+	If cache is True, traced segments are stored in default geometry_cache,
+	cache can be also instance of GeometryCache.
+
+	If matrix_cache is set (MatrixCache or directory), encoded modules are
+	stored on disk and reused across runs.
+
+	If form is True, code is stored as form XObject and reused if same code is
+	drawn again to same canvas.
+
+	Instead of parameters, it's possible to pass prepared QRStyle as style
+	argument. Only x and y can be used with style.
+
+	Drawing is thread-safe if each thread uses own canvas. Styles and cache
+	can be shared between threads.
+	"""
+	x = kwargs.pop('x', None) if style is not None else None
+	y = kwargs.pop('y', None) if style is not None else None
+	style = get_style(style, kwargs)
 	if isinstance(text, str):
 		text = text.encode('utf-8')
-	build_qrcode(params, text).save(canvas)
+	draw_qrcode(canvas, style, text, cache, form, x, y, matrix_cache)
 
 
-def qr(canvas, params=None):
+def qr(canvas, params=None, cache=None, form=False, style=None, matrix_cache=None):
 	"""
 	Generate QR code using plugInGraphic or plugInFlowable
 
@@ -707,5 +1887,177 @@ def qr(canvas, params=None):
 	<illustration height="5cm" width="5cm" align="center">
 		<plugInGraphic module="reportlab_qrcode" function="qr">size=5cm;text;Simple text</plugInGraphic>
 	</illustration>
+
+	Traced segments are cached if cache=1 is in parameters. Code is reused as
+	form XObject with form=1 parameter. Parameters part of string is compiled
+	to QRStyle only once. Prepared style can be passed as style argument, in
+	this case parameters part of string must be empty.
+	"""
+	parsed_params, fmt, text = split_params_string(params)
+	if style is None:
+		style = QRStyle.from_string(parsed_params)
+	elif parsed_params:
+		raise ValueError("Parameters '%s' can't be combined with style" % parsed_params)
+	text = decode_text(fmt, text)
+	draw_qrcode(canvas, style, text, style.options.get('cache', cache), style.options.get('form', form), matrix_cache=matrix_cache)
+
+
+def qr_draw_many(canvas, items, cache=None, style=None, matrix_cache=None, **kwargs):
+	"""
+	Draw many QR codes with shared style
+
+	Items are tuples (text, x, y) or (text, x, y, overrides), where overrides
+	is dictionary of parameters replacing shared parameters for single code.
+	Shared style is validated only once.
+	"""
+	style = get_style(style, kwargs)
+	cache = get_cache(cache)
+	matrix_cache = get_matrix_cache(matrix_cache)
+	styles = {}
+
+	def get_item_style(overrides):
+		if not overrides:
+			return style
+		style_key = freeze_value(overrides)
+		item_style = styles.get(style_key)
+		if item_style is None:
+			item_style = style.replace(**overrides)
+			styles[style_key] = item_style
+		return item_style
+
+	for text, x, y, *overrides in items:
+		item_style = get_item_style(overrides[0] if overrides else None)
+		if isinstance(text, str):
+			text = text.encode('utf-8')
+		img = build_qrcode(item_style, text, cache, matrix_cache)
+		img.x = Transforms.to_length(x)
+		img.y = Transforms.to_length(y)
+		img.save(canvas)
+
+
+def grid_positions(columns: int, rows: int, cell_width, cell_height, x=0, y=0):
+	"""
+	Returns positions of grid cells in reading order (from top left cell)
+
+	Coordinates x and y are position of bottom left corner of grid.
+	"""
+	cell_width = Transforms.to_length(cell_width)
+	cell_height = Transforms.to_length(cell_height)
+	x = Transforms.to_length(x)
+	y = Transforms.to_length(y)
+	return [
+		(x + col * cell_width, y + (rows - row - 1) * cell_height)
+		for row in range(rows)
+		for col in range(columns)
+	]
+
+
+def qr_draw_sheets(canvas, texts, columns: int, rows: int, cell_width, cell_height, x=0, y=0, cache=None, style=None, matrix_cache=None, **kwargs):
+	"""
+	Draw QR codes to grid of cells, new page is started when sheet is full
+
+	Codes are placed to bottom left corner of cell.
+	"""
+	positions = grid_positions(columns, rows, cell_width, cell_height, x, y)
+
+	def get_items():
+		for index, text in enumerate(texts):
+			if index and index % len(positions) == 0:
+				canvas.showPage()
+			yield (text, *positions[index % len(positions)])
+
+	qr_draw_many(canvas, get_items(), cache, style, matrix_cache, **kwargs)
+
+
+class AsyncRenderer:
+	"""
+	Encode and trace codes in executor without blocking event loop
+
+	Executor can be thread or process pool, default executor of event loop is
+	used if it's None. At most max_concurrency codes are submitted to executor
+	at once. Process pool can't share GeometryCache instance, use cache=True
+	(cache of worker process) or directory as matrix_cache. Renderer can be
+	used from multiple event loops, concurrency is limited in each loop
+	separately.
+	"""
+
+	def __init__(self, executor=None, max_concurrency: int = None, cache=None, matrix_cache=None):
+		self.executor = executor
+		self.max_concurrency = max_concurrency
+		self.cache = cache
+		self.matrix_cache = matrix_cache
+		self.semaphores = {}
+		self.lock = threading.Lock()
+
+	async def render(self, text, style=None, **kwargs) -> QRGeometry:
+		"""
+		Returns geometry of code, which can be drawn to canvas using draw()
+
+		Cancellation of waiting task removes job from executor queue, running
+		job finishes in background and it's counted to max_concurrency until
+		it's finished.
+		"""
+		# asyncio is slow to import and it's needed only here
+		import asyncio
+
+		style = get_style(style, kwargs)
+		if isinstance(text, str):
+			text = text.encode('utf-8')
+		loop = asyncio.get_running_loop()
+		job = partial(build_geometry, style, text, self.cache, self.matrix_cache)
+		if self.max_concurrency is None:
+			return await loop.run_in_executor(self.executor, job)
+		# semaphore is bound to loop, in which it's used first
+		semaphore = self.semaphores.get(loop)
+		if semaphore is None:
+			with self.lock:
+				for closed_loop in [key for key in self.semaphores if key.is_closed()]:
+					del self.semaphores[closed_loop]
+				semaphore = self.semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+		await semaphore.acquire()
+		try:
+			future = self.submit(loop, job)
+		except BaseException:
+			semaphore.release()
+			raise
+
+		def release(__):
+			try:
+				loop.call_soon_threadsafe(semaphore.release)
+			except RuntimeError: # loop is closed
+				pass
+
+		future.add_done_callback(release)
+		return await asyncio.wrap_future(future)
+
+	def submit(self, loop, job):
+		"""
+		Returns concurrent future, which is done when job is finished or
+		cancelled before start
+		"""
+		if self.executor is not None:
+			return self.executor.submit(job)
+		# default executor of loop can be used only with run_in_executor
+		import concurrent.futures
+		future = concurrent.futures.Future()
+
+		def run():
+			if not future.set_running_or_notify_cancel():
+				return
+			try:
+				result = job()
+			except BaseException as e:
+				future.set_exception(e)
+			else:
+				future.set_result(result)
+
+		loop.run_in_executor(None, run)
+		return future
+
+
+async def qr_render_async(text, style=None, executor=None, cache=None, matrix_cache=None, **kwargs) -> QRGeometry:
+	"""
+	Encode and trace code in executor, returns geometry, which can be drawn to
+	canvas in event loop using geometry.draw(canvas)
 	"""
-	build_qrcode(*parse_params_string(params)).save(canvas)
+	return await AsyncRenderer(executor, cache=cache, matrix_cache=matrix_cache).render(text, style, **kwargs)
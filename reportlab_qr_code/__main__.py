@@ -1,33 +1,108 @@
 # -*- coding: utf-8 -*-
 import argparse
+import io
+import json
+import os
+import stat
+import struct
 import sys
 from base64 import b64decode
+from contextlib import redirect_stdout
 from copy import deepcopy
+from functools import lru_cache
 
-from reportlab.graphics import renderPM, renderPS, renderSVG
-from reportlab.graphics.shapes import Drawing, Path
-from reportlab.graphics.transform import transformPoint
+from reportlab.lib import pagesizes
 from reportlab.lib.colors import toColor
+from reportlab.lib.rl_accel import fp_str
+from reportlab.lib.units import toLength
 from reportlab.pdfgen import canvas
 
-from . import DEFAULT_PARAMS, clean_params, build_qrcode
+from . import (
+	DEFAULT_PARAMS, STYLE_CACHE_SIZE, GeometryCache, QRStyle, build_qrcode, clean_params, decode_text, freeze_value,
+	geometry_cache, split_params_string
+)
 
 
-class PathAdapter(Path):
-	def close(self):
-		return self.closePath()
+# Command line options of batch record keys, flags have options for true and false
+BATCH_RECORD_OPTIONS = {
+	'base64': ('--base64', '--no-base64'),
+	'version': '--version',
+	'error_correction': '--error_correction',
+	'size': '--size',
+	'padding': '--padding',
+	'fg': '--fg',
+	'bg': '--bg',
+	'invert': ('--invert', '--no-invert'),
+	'negative': ('--negative', '--no-negative'),
+	'radius': '--radius',
+	'enhanced_path': ('--enhanced-path', '--no-enhanced-path'),
+	'gradient': '--gradient',
+	'hole': '--hole',
+	'draw_mode': '--draw-mode',
+}
+BATCH_CHUNK_SIZE = 16
+OUTPUT_FORMATS = ['PDF', 'EPS', 'SVG', 'PNG', 'GIF', 'JPG', 'TIFF', 'BMP', 'PPM']
+RASTER_FORMATS = {'PNG', 'GIF', 'JPG', 'TIFF', 'BMP', 'PPM'}
+# Options of server process, which can't be used in request
+SERVE_OPTIONS = {'input_file', 'null', 'outfile', 'batch', 'batch_format', 'outdir', 'jobs', 'matrix_cache', 'serve'}
+# Request is payload with 32-bit length, response has additional status byte
+REQUEST_HEADER = struct.Struct('>I')
+RESPONSE_HEADER = struct.Struct('>BI')
+RESPONSE_OK = 0
+RESPONSE_ERROR = 1
+MAX_REQUEST_SIZE = 16 * 1024 * 1024
+# Binary digits to values of 8-bit mask
+BITS_TO_MASK = bytes.maketrans(b'01', b'\x00\xff')
+PDF_TO_SVG_OPERATORS = {'m': 'M', 'l': 'L', 'c': 'C', 'h': 'Z'}
+
+
+@lru_cache(maxsize=None)
+def get_path_adapter():
+	"""
+	Returns path class of graphics shapes with canvas path interface
+
+	Graphics shapes are slow to import, so they are imported only for formats
+	rendered using Drawing.
+	"""
+	from reportlab.graphics.shapes import Path
+
+	class PathAdapter(Path):
+		def close(self):
+			return self.closePath()
+
+		def rect(self, x, y, width, height):
+			self.moveTo(x, y)
+			self.lineTo(x + width, y)
+			self.lineTo(x + width, y + height)
+			self.lineTo(x, y + height)
+			self.closePath()
+
+	return PathAdapter
 
 
 class CanvasAdapter:
 	def __init__(self, output, file_format):
 		self.output = output
 		self.file_format = file_format
-		self.drawing = Drawing()
+		self.page_size = ()
+		self.current_drawing = None
 		self.fill_color = (0, 0, 0)
 		self.fill_alpha = 1.0
 		self.transform_stack = [(1, 0, 0, 1, 0, 0)]
+		self.raster = None
+
+	@property
+	def drawing(self):
+		# created on first use, raster images are drawn without Drawing
+		if self.current_drawing is None:
+			from reportlab.graphics.shapes import Drawing
+			self.current_drawing = Drawing(*self.page_size)
+		return self.current_drawing
 
-	def setPageSize(self, size): self.drawing = Drawing(size[0], size[1])
+	def setPageSize(self, size):
+		self.page_size = (size[0], size[1])
+		self.current_drawing = None
+		self.raster = None
 
 	def saveState(self):
 		self.transform_stack.append(self.transform_stack[-1])
@@ -36,7 +111,9 @@ class CanvasAdapter:
 		self.transform_stack.pop()
 
 	def transform(self, a, b, c, d, e, f):
-		self.transform_stack[-1] = (a, b, c, d, e, f)
+		# concatenate with current matrix like canvas
+		a0, b0, c0, d0, e0, f0 = self.transform_stack[-1]
+		self.transform_stack[-1] = (a0*a+c0*b, b0*a+d0*b, a0*c+c0*d, b0*c+d0*d, a0*e+c0*f+e0, b0*e+d0*f+f0)
 
 	def setFillColor(self, color):
 		self.fill_color = color
@@ -45,10 +122,15 @@ class CanvasAdapter:
 		self.fill_alpha = alpha
 
 	def beginPath(self):
-		return PathAdapter()
+		return get_path_adapter()()
+
+	def rect(self, x, y, width, height, stroke=1, fill=0):
+		path = self.beginPath()
+		path.rect(x, y, width, height)
+		self.drawPath(path, stroke=stroke, fill=fill, fillMode=canvas.FILL_EVEN_ODD)
 
 	def drawPath(self, path, stroke=1, fill=0, fillMode=None):
-		path = deepcopy(path)
+		# path is not used after drawing, so it's modified in place
 		path.strokeWidth = stroke
 		path.fillMode = fillMode
 		if fill:
@@ -57,18 +139,87 @@ class CanvasAdapter:
 		else:
 			path.fillColor = None
 
-		# for x, y poairs
-		for i in range(0, len(path.points), 2):
-			path.points[i], path.points[i + 1] = transformPoint(self.transform_stack[-1], (path.points[i], path.points[i + 1]))
+		# transform all x, y pairs at once
+		a, b, c, d, e, f = self.transform_stack[-1]
+		xs = path.points[0::2]
+		ys = path.points[1::2]
+		path.points[0::2] = [a*x+c*y+e for x, y in zip(xs, ys)]
+		path.points[1::2] = [b*x+d*y+f for x, y in zip(xs, ys)]
 
 		self.drawing.add(path)
 
+	def draw_raster(self, qr):
+		"""
+		Draw square code directly to pixel image
+
+		Returns False if format is not raster format or if code is not aligned
+		to pixels, so vector rendering would produce different pixels.
+		"""
+		if self.file_format not in RASTER_FORMATS or qr.mask or qr.x or qr.y:
+			return False
+		scale = (qr.size - qr.padding * 2) / qr.width
+		if not all(abs(value - round(value)) < 1e-6 for value in (qr.size, qr.padding, scale)):
+			return False
+
+		layers = []
+		for part, segments in zip(qr.draw_parts, qr.get_part_segments()):
+			qr.begin_part(part, mask=False)
+			try:
+				if qr.radius != 0 and qr.draw_mode != 'rects':
+					return False
+				layers.append((qr.fg, qr.fg_alpha, get_module_rows(qr.width, qr.draw_mode, segments)))
+			finally:
+				qr.finish_part()
+
+		from PIL import Image, ImageChops
+
+		size, padding, scale = round(qr.size), round(qr.padding), round(scale)
+		image = Image.new('RGB', (size, size), 'white')
+		if qr.bg is not None:
+			image.paste(toColor(qr.bg).bitmap_rgb(), (0, 0, size, size), Image.new('L', (size, size), round(qr.bg_alpha * 255)))
+		for fg, fg_alpha, rows in layers:
+			data = b''.join(format(row, f'0{qr.width}b').encode('ascii') for row in rows).translate(BITS_TO_MASK)
+			mask = Image.frombytes('L', (qr.width, qr.width), data).resize((qr.width * scale, qr.width * scale), Image.NEAREST)
+			if qr.negative:
+				negative = Image.new('L', (size, size), 255)
+				negative.paste(ImageChops.invert(mask), (padding, padding))
+				mask = negative
+			else:
+				code_mask = Image.new('L', (size, size), 0)
+				code_mask.paste(mask, (padding, padding))
+				mask = code_mask
+			if fg_alpha < 1.0:
+				mask = mask.point(lambda value, alpha=fg_alpha: round(value * alpha))
+			image.paste(toColor(fg).bitmap_rgb(), (0, 0, size, size), mask)
+		self.raster = image
+		return True
+
+	def save_raster(self):
+		image = self.raster
+		image_format = self.file_format
+		options = {}
+		if image_format == 'GIF':
+			from PIL import Image
+			image = image.convert('P', dither=Image.NONE, palette=Image.ADAPTIVE)
+		elif image_format == 'JPG':
+			image_format = 'JPEG'
+		elif image_format == 'TIFF':
+			options = {'resolution': 72, 'resolution unit': 'inch'}
+		image.save(self.output, image_format, **options)
+
 	def showPage(self):
+		if self.raster is not None:
+			self.save_raster()
+			return
+		# renderers are imported only for chosen format
 		if self.file_format == 'SVG':
+			from reportlab.graphics import renderSVG
 			picture = renderSVG.drawToString(self.drawing).encode('utf-8')
 		elif self.file_format == 'EPS':
+			from reportlab.graphics import renderPS
 			picture = renderPS.drawToString(self.drawing)
 		else:
+			from reportlab.graphics import renderPM
 			picture = renderPM.drawToString(self.drawing, fmt=self.file_format)
 		self.output.write(picture)
 
@@ -76,7 +227,116 @@ class CanvasAdapter:
 		pass
 
 
-def generate(text, c, **args):
+class SvgCanvas:
+	"""
+	Writes SVG directly to output stream, one path for each draw part
+	"""
+
+	def __init__(self, output):
+		self.output = output
+		self.started = False
+		self.height = 0
+
+	def setPageSize(self, size):
+		if not self.started:
+			self.height = size[1]
+			self.write(
+				'<?xml version="1.0" encoding="UTF-8"?>\n'
+				f'<svg xmlns="http://www.w3.org/2000/svg" width="{fp_str(size[0])}" height="{fp_str(size[1])}" viewBox="0 0 {fp_str(size[0])} {fp_str(size[1])}">\n'
+			)
+			self.started = True
+
+	def write(self, text):
+		self.output.write(text.encode('utf-8'))
+
+	def get_fill(self, color, alpha):
+		fill = 'fill="#%02x%02x%02x"' % toColor(color).bitmap_rgb()
+		if alpha < 1.0:
+			fill += f' fill-opacity="{fp_str(alpha)}"'
+		return fill
+
+	def draw_qrcode(self, qr):
+		# y axis points down, position of code is measured from bottom like on canvas
+		top = self.height - qr.y - qr.size
+		if qr.bg is not None:
+			self.write(f'<rect x="{fp_str(qr.x)}" y="{fp_str(top)}" width="{fp_str(qr.size)}" height="{fp_str(qr.size)}" {self.get_fill(qr.bg, qr.bg_alpha)}/>\n')
+		scale = (qr.size - qr.padding * 2) / qr.width
+		pad = qr.padding / scale if qr.negative else None
+		self.write(f'<g transform="translate({fp_str(qr.x + qr.padding)} {fp_str(top + qr.padding)}) scale({fp_str(scale)})">\n')
+		for part, segments in zip(qr.draw_parts, qr.get_part_segments()):
+			qr.begin_part(part, mask=False)
+			try:
+				self.write(f'<path {self.get_fill(qr.fg, qr.fg_alpha)} fill-rule="evenodd" d="{get_svg_path_data(qr, segments, pad)}"/>\n')
+			finally:
+				qr.finish_part()
+		self.write('</g>\n')
+
+	def showPage(self):
+		self.write('</svg>\n')
+		self.started = False
+
+	def save(self):
+		pass
+
+
+def get_svg_path_data(qr, segments, pad=None):
+	"""
+	Returns SVG path data of segments in module coordinates
+	"""
+	if qr.radius != 0 and qr.draw_mode != 'rects':
+		# convert PDF operators to SVG commands (operands are written before operator in PDF)
+		data = []
+		operands = []
+		for token in qr.get_path_code(segments, pad).split():
+			if token in PDF_TO_SVG_OPERATORS:
+				data.append(PDF_TO_SVG_OPERATORS[token] + ' '.join(operands))
+				operands = []
+			elif token != 'n':
+				operands.append(token)
+		return ''.join(data)
+
+	data = []
+	if pad is not None:
+		low = fp_str(-pad)
+		high = fp_str(qr.width + pad)
+		data.append(f'M{low} {low}H{high}V{high}H{low}Z')
+	if qr.draw_mode == 'rects':
+		data += [f'M{x} {y}h{w}v{h}h-{w}z' for x, y, w, h in segments]
+		return ''.join(data)
+	for segment in segments:
+		x, y = segment[0]
+		data.append(f'M{x} {y}')
+		for next_x, next_y in segment[1:-1]:
+			# path consists of horizontal and vertical lines
+			data.append(f'H{next_x}' if next_y == y else f'V{next_y}')
+			x, y = next_x, next_y
+		data.append('Z')
+	return ''.join(data)
+
+
+def get_module_rows(width, draw_mode, segments):
+	"""
+	Returns rows of modules filled by segments (or rectangles) using even-odd
+	rule, first column is most significant bit of row
+	"""
+	rows = [0] * width
+	if draw_mode == 'rects':
+		for x, y, w, h in segments:
+			bits = ((1 << w) - 1) << (width - x - w)
+			for row in range(y, y + h):
+				rows[row] ^= bits
+		return rows
+	for segment in segments:
+		for (x1, y1), (x2, y2) in zip(segment, segment[1:]):
+			# vertical edge inverts all modules on right side
+			if x1 == x2:
+				bits = (1 << (width - x1)) - 1
+				for row in range(min(y1, y2), max(y1, y2)):
+					rows[row] ^= bits
+	return rows
+
+
+def get_params(args):
 	params = DEFAULT_PARAMS.copy()
 	if args['version'] is not None:
 		params['version'] = args['version']
@@ -95,22 +355,50 @@ def generate(text, c, **args):
 		params['hole'] = args['hole']
 	if args['enhanced_path'] is not None:
 		params['enhanced_path'] = args['enhanced_path']
+	if args['draw_mode'] is not None:
+		params['draw_mode'] = args['draw_mode']
 	if args['gradient']:
 		params['mask'] = True
 	if args['draw'] is not None:
 		params['draw_parts'] = [{'draw': args['draw']}]
 	clean_params(params)
+	return params
+
 
+def build_layer(text, args, cache=None, style=None):
 	if isinstance(text, str):
 		text = text.encode('utf-8')
-	qr = build_qrcode(params, text)
+	return build_qrcode(get_params(args) if style is None else style, text, cache, args['matrix_cache'])
 
-	c.setPageSize((qr.size, qr.size))
+
+def build_codes(text, layers, cache=None, get_style=None):
+	"""
+	Returns list of built codes with gradients for all layers of text
+	"""
+	return [
+		(build_layer(text, args, cache, None if get_style is None else get_style(args)), args['gradient'])
+		for args in layers
+	]
+
+
+def draw_code(qr, c, gradient=None, position=None):
+	"""
+	Draw built code to page of its size or to position (x, y) of current page
+	"""
+	if position is None:
+		c.setPageSize((qr.size, qr.size))
+		if isinstance(c, SvgCanvas):
+			c.draw_qrcode(qr)
+			return
+		if isinstance(c, CanvasAdapter) and c.draw_raster(qr):
+			return
 	c.saveState()
+	if position is not None:
+		c.translate(*position)
 	qr.save(c)
 
-	if args['gradient']:
-		gradient_type, coords, colors, positions = args['gradient']
+	if gradient:
+		gradient_type, coords, colors, positions = gradient
 		if len(colors) == 1:
 			c.setFillColor(colors[0][1])
 			c.rect(0, 0, qr.size, qr.size, fill=1, stroke=0)
@@ -130,6 +418,98 @@ def generate(text, c, **args):
 	c.restoreState()
 
 
+class PageLayout:
+	"""
+	Draws each code to own page with size of code
+	"""
+
+	def __init__(self, c):
+		self.c = c
+
+	def draw(self, codes):
+		"""
+		Draw layers of single code, codes is list of (qr, gradient)
+		"""
+		for qr, gradient in codes:
+			draw_code(qr, self.c, gradient)
+		self.c.showPage()
+
+	def finish(self):
+		pass
+
+
+class TileLayout(PageLayout):
+	"""
+	Tiles codes to rows from top left corner of pages with fixed size
+	"""
+
+	def __init__(self, c, page_size, margin=0.0, gutter=0.0):
+		super().__init__(c)
+		self.width, self.height = page_size
+		self.margin = margin
+		self.gutter = gutter
+		self.x = margin
+		self.y = self.height - margin
+		self.row_height = 0.0
+		self.empty = True
+		c.setPageSize(page_size)
+
+	def place(self, size):
+		"""
+		Returns position of bottom left corner of code, new row or page is
+		started if code doesn't fit
+		"""
+		if self.x > self.margin and self.x + size > self.width - self.margin:
+			self.x = self.margin
+			self.y -= self.row_height + self.gutter
+			self.row_height = 0.0
+		if not self.empty and self.y - size < self.margin:
+			self.c.showPage()
+			self.x = self.margin
+			self.y = self.height - self.margin
+			self.row_height = 0.0
+		position = (self.x, self.y - size)
+		self.x += size + self.gutter
+		self.row_height = max(self.row_height, size)
+		self.empty = False
+		return position
+
+	def draw(self, codes):
+		position = self.place(max(qr.size for qr, __ in codes))
+		for qr, gradient in codes:
+			draw_code(qr, self.c, gradient, position)
+
+	def finish(self):
+		if not self.empty:
+			self.c.showPage()
+
+
+def create_layout(c, args):
+	if args['page_size'] is None:
+		return PageLayout(c)
+	return TileLayout(c, args['page_size'], args['margin'], args['gutter'])
+
+
+def parse_page_size(val):
+	"""
+	Returns page size from name (e.g. A4) or from width:height
+	"""
+	size = getattr(pagesizes, val.upper(), None)
+	if isinstance(size, tuple):
+		return size
+	dimensions = val.split(':')
+	if len(dimensions) != 2:
+		raise ValueError("Invalid page size")
+	return (toLength(dimensions[0]), toLength(dimensions[1]))
+
+
+def read_texts(stream, separator):
+	"""
+	Returns non-empty texts from stream delimited by separator
+	"""
+	return [text for text in stream.read().split(separator) if text]
+
+
 def parse_gradient(val):
 	try:
 		steps = []
@@ -194,7 +574,393 @@ def parse_gradient(val):
 		raise
 
 
-def main():
+def split_draw_arguments(argv):
+	"""
+	Split arguments to global arguments and list of arguments for each draw
+	command
+	"""
+	arg_list = []
+	arg_lists = [arg_list]
+	for arg in argv:
+		if arg == '--draw' or arg.startswith('--draw='):
+			arg_list = ['--draw']
+			arg_lists.append(arg_list)
+			if arg.startswith('--draw='):
+				arg_list.append(arg[7:])
+		else:
+			arg_list.append(arg)
+	return arg_lists
+
+
+def parse_layers(parser, arg_lists):
+	"""
+	Returns list of arguments for each drawn layer
+	"""
+	base_args = vars(parser.parse_args(arg_lists[0]))
+	base_args.pop('text')
+	if len(arg_lists) == 1:
+		return [base_args]
+	layers = []
+	for arg_list in arg_lists[1:]:
+		arguments = vars(parser.parse_args(arg_list))
+		arguments.pop('text')
+		args = deepcopy(base_args)
+		args.update(arguments)
+		layers.append(args)
+	return layers
+
+
+def record_to_argv(record):
+	"""
+	Convert options of JSON record to command line arguments
+	"""
+	argv = []
+	for key, value in record.items():
+		option = BATCH_RECORD_OPTIONS.get(key)
+		if option is None:
+			raise ValueError(f"Unknown record option '{key}'")
+		if isinstance(option, tuple):
+			if not isinstance(value, bool):
+				raise ValueError(f"Option '{key}' must be boolean")
+			argv.append(option[0] if value else option[1])
+		elif isinstance(value, (str, int, float)) and not isinstance(value, bool):
+			# value can start with minus sign
+			argv.append(f'{option}={value}')
+		else:
+			raise ValueError(f"Option '{key}' must be string or number")
+	return argv
+
+
+def read_records(parser, stream, arg_lists, record_format):
+	"""
+	Read batch records, returns pairs of text and list of layer arguments
+
+	Styles of all layers are compiled, so invalid records are reported before
+	rendering.
+	"""
+	record_parser = get_request_parser()
+	for num, line in enumerate(stream, 1):
+		line = line.rstrip('\r\n')
+		if not line:
+			continue
+		argv = []
+		try:
+			if record_format == 'jsonl':
+				record = json.loads(line)
+				if not isinstance(record, dict):
+					raise ValueError("Record is not an object")
+				if not isinstance(record.get('text'), str):
+					raise ValueError("Option 'text' must be string")
+				line = record.pop('text')
+				argv = record_to_argv(record)
+			layers = parse_layers(record_parser, [arg_lists[0] + argv] + arg_lists[1:])
+			for args in layers:
+				compile_layer_style(freeze_value(args))
+			text = b64decode(line) if layers[0]['base64'] else line
+		except ValueError as e: # json and base64 errors are ValueError too
+			parser.error(f"Invalid batch record on line {num}: {e}")
+		yield text, layers
+
+
+def trace_record(record):
+	"""
+	Encode and trace all layers of record, returns cache entries
+	"""
+	text, layers = record
+	if isinstance(text, str):
+		text = text.encode('utf-8')
+	cache = GeometryCache(max_size=float('inf'))
+	for args in layers:
+		build_qrcode(get_params(args), text, cache, args['matrix_cache'])
+	return [(key, width, part_segments, modules) for key, (width, part_segments, __, modules) in cache.entries.items()]
+
+
+def render_record(job):
+	"""
+	Render record to separate file
+	"""
+	filename, image_format, compress, (text, layers) = job
+	with open(filename, 'wb') as output:
+		c = create_canvas(output, image_format, compress)
+		layout = create_layout(c, layers[0])
+		layout.draw(build_codes(text, layers))
+		layout.finish()
+		c.save()
+	return filename
+
+
+def create_canvas(output, image_format, compress):
+	if image_format == 'PDF':
+		return canvas.Canvas(
+			output,
+			pageCompression=1 if compress else 0
+		)
+	if image_format == 'SVG':
+		return SvgCanvas(output)
+	return CanvasAdapter(output, image_format)
+
+
+def open_output(outfile):
+	if not outfile or outfile == '-':
+		return sys.stdout.buffer
+	return open(outfile, 'wb')
+
+
+def check_format(base_args, image_format, count=1):
+	"""
+	Check if output format supports requested features
+	"""
+	if base_args['gradient'] and image_format != 'PDF':
+		raise ValueError("Gradient is supported only for PDF format")
+	if (count > 1 or base_args['page_size'] is not None) and image_format != 'PDF':
+		raise ValueError("Multiple codes and --page-size are supported only for PDF format")
+
+
+def run_batch(parser, arg_lists, base_args, image_format):
+	"""
+	Generate code for each record of batch file
+	"""
+	jobs = base_args['jobs'] or os.cpu_count()
+	if base_args['batch'] == '-':
+		stream = sys.stdin
+	else:
+		stream = open(base_args['batch'], 'r', encoding='utf-8')
+	executor = None
+	if jobs > 1:
+		from concurrent.futures import ProcessPoolExecutor
+		executor = ProcessPoolExecutor(max_workers=jobs)
+
+	def job_map(fn, items):
+		if executor is None:
+			return map(fn, items)
+		return executor.map(fn, items, chunksize=BATCH_CHUNK_SIZE)
+
+	try:
+		records = read_records(parser, stream, arg_lists, base_args['batch_format'])
+
+		if base_args['outdir']:
+			# each record to separate file, rendered in workers
+			os.makedirs(base_args['outdir'], exist_ok=True)
+			extension = image_format.lower()
+			render_jobs = (
+				(os.path.join(base_args['outdir'], f'{num:06d}.{extension}'), image_format, base_args['compress'], record)
+				for num, record in enumerate(records)
+			)
+			for __ in job_map(render_record, render_jobs):
+				pass
+			return
+
+		if image_format != 'PDF':
+			raise ValueError("Batch output to single file is supported only for PDF format, use --outdir")
+
+		# records are encoded and traced in workers, but rendered in order to single document
+		records = list(records)
+		output = open_output(base_args['outfile'])
+		try:
+			c = create_canvas(output, image_format, base_args['compress'])
+			layout = create_layout(c, base_args)
+			for (text, layers), geometries in zip(records, job_map(trace_record, records)):
+				cache = GeometryCache(max_size=float('inf'))
+				for key, width, part_segments, modules in geometries:
+					cache.put(key, width, part_segments, modules)
+				layout.draw(build_codes(text, layers, cache))
+			layout.finish()
+			c.save()
+		finally:
+			if output is not sys.stdout.buffer:
+				output.close()
+	finally:
+		if executor is not None:
+			executor.shutdown()
+		if stream is not sys.stdin:
+			stream.close()
+
+
+class RequestArgumentParser(argparse.ArgumentParser):
+	"""
+	Parser of server requests, errors are raised instead of exiting process
+	"""
+
+	def error(self, message):
+		raise ValueError(message)
+
+
+@lru_cache(maxsize=None)
+def get_request_parser():
+	return create_parser(RequestArgumentParser, add_help=False)
+
+
+@lru_cache(maxsize=STYLE_CACHE_SIZE)
+def compile_layer_style(frozen_args):
+	"""
+	Returns style of layer arguments, styles are compiled once in process
+	"""
+	params = get_params(dict(frozen_args))
+	return QRStyle.from_params(deepcopy(params), params)
+
+
+def render_request(payload, matrix_cache=None):
+	"""
+	Render code from JSON request of server, returns content of output file
+
+	Traced codes are stored in default geometry cache of process.
+	"""
+	request = json.loads(payload)
+	output = io.BytesIO()
+	if isinstance(request, dict):
+		unknown = set(request) - {'params', 'format', 'compress'}
+		if unknown or 'params' not in request:
+			raise ValueError("Request object must contain params and optionally format and compress")
+		image_format = request.get('format', 'PDF')
+		if image_format not in OUTPUT_FORMATS:
+			raise ValueError(f"Unknown format {image_format}")
+		parsed_params, fmt, text = split_params_string(request['params'])
+		qr = build_qrcode(QRStyle.from_string(parsed_params), decode_text(fmt, text), geometry_cache, matrix_cache)
+		c = create_canvas(output, image_format, request.get('compress', True))
+		draw_code(qr, c)
+		c.showPage()
+		c.save()
+		return output.getvalue()
+
+	if not isinstance(request, list) or not all(isinstance(arg, str) for arg in request):
+		raise ValueError("Request must be list of arguments or object")
+	parser = get_request_parser()
+	arg_lists = split_draw_arguments(request)
+	base_args = vars(parser.parse_args(arg_lists[0]))
+	for option in SERVE_OPTIONS:
+		if base_args[option] != parser.get_default(option):
+			raise ValueError(f"Option {option} can't be used in request")
+	texts = base_args['text']
+	if not texts:
+		raise ValueError("Missing text")
+	check_format(base_args, base_args['format'], len(texts))
+	if base_args['base64']:
+		texts = [b64decode(text) for text in texts]
+	layers = parse_layers(parser, arg_lists)
+	for args in layers:
+		args['matrix_cache'] = matrix_cache
+	c = create_canvas(output, base_args['format'], base_args['compress'])
+	layout = create_layout(c, base_args)
+	for text in texts:
+		layout.draw(build_codes(text, layers, geometry_cache, lambda args: compile_layer_style(freeze_value(args))))
+	layout.finish()
+	c.save()
+	return output.getvalue()
+
+
+def read_request(reader):
+	"""
+	Returns payload of next request or None at end of stream
+	"""
+	header = reader.read(REQUEST_HEADER.size)
+	if not header:
+		return None
+	if len(header) < REQUEST_HEADER.size:
+		raise ValueError("Truncated request")
+	size, = REQUEST_HEADER.unpack(header)
+	if size > MAX_REQUEST_SIZE:
+		raise ValueError("Request is too large")
+	payload = reader.read(size)
+	if len(payload) < size:
+		raise ValueError("Truncated request")
+	return payload
+
+
+def write_response(writer, status, data):
+	writer.write(RESPONSE_HEADER.pack(status, len(data)) + data)
+	writer.flush()
+
+
+def serve_stream(reader, writer, render):
+	"""
+	Answer requests until end of stream, errors of requests are sent to client
+	"""
+	while True:
+		try:
+			payload = read_request(reader)
+		except ValueError as e:
+			# stream can't be synchronized again
+			write_response(writer, RESPONSE_ERROR, str(e).encode('utf-8'))
+			return
+		if payload is None:
+			return
+		try:
+			data = render(payload)
+		except Exception as e:
+			write_response(writer, RESPONSE_ERROR, str(e).encode('utf-8'))
+		else:
+			write_response(writer, RESPONSE_OK, data)
+
+
+def create_server(path, render):
+	"""
+	Returns server listening on unix socket, each client is served in own
+	thread, socket left by terminated server is removed
+	"""
+	# sockets are needed only in server mode
+	import socket
+	import socketserver
+
+	class ServeHandler(socketserver.StreamRequestHandler):
+		def handle(self):
+			try:
+				serve_stream(self.rfile, self.wfile, self.server.render)
+			except (BrokenPipeError, ConnectionResetError): # client disconnected
+				pass
+
+	if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+		with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+			try:
+				sock.connect(path)
+			except ConnectionRefusedError:
+				os.unlink(path)
+			else:
+				raise ValueError(f"Server is already running on {path}")
+	server = socketserver.ThreadingUnixStreamServer(path, ServeHandler)
+	server.daemon_threads = True
+	server.render = render
+	return server
+
+
+def run_server(base_args):
+	"""
+	Render requests until end of stdin or until server is interrupted
+
+	Requests from socket clients are rendered in pool of worker processes,
+	each worker keeps compiled styles and traced codes between requests.
+	"""
+	matrix_cache = base_args['matrix_cache']
+	if base_args['serve'] == '-':
+		output = sys.stdout.buffer
+		# stdout is reserved for responses
+		with redirect_stdout(sys.stderr):
+			serve_stream(sys.stdin.buffer, output, lambda payload: render_request(payload, matrix_cache))
+		return
+
+	jobs = base_args['jobs'] or os.cpu_count()
+	executor = None
+	if jobs > 1:
+		from concurrent.futures import ProcessPoolExecutor
+		executor = ProcessPoolExecutor(max_workers=jobs)
+
+	def render(payload):
+		if executor is None:
+			return render_request(payload, matrix_cache)
+		return executor.submit(render_request, payload, matrix_cache).result()
+
+	server = create_server(base_args['serve'], render)
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+		os.unlink(base_args['serve'])
+		if executor is not None:
+			executor.shutdown()
+
+
+def create_parser(parser_class=argparse.ArgumentParser, **kwargs):
 	gradient_help = """
 Either "linear x1 y1 x2 y2 colors" or "radial x y radius colors" Dimensions are
 in range [0, 1], position (0, 0) is top left corner, (1, 1) is bottom right
@@ -217,10 +983,28 @@ first draw are globally set. Arguments after draw are specific for preceding
 draw call.
 """
 
-	parser = argparse.ArgumentParser(description="Generate qr code")
-	parser.add_argument('text', nargs='?', type=str, help="Input text or stdin if omitted")
+	batch_help = """
+Read records from file (or stdin if value is -) and generate code for each
+record. Record is either line of text or JSON object with text and options
+like {"text": "content", "fg": "#ff0000", "radius": 0.5} if --batch-format is
+jsonl. Without --outdir, all codes are written to single PDF document, one code
+per page.
+"""
+
+	serve_help = """
+Keep running and render requests from clients connected to unix socket at
+this path (or from stdin to stdout if value is -). Request is JSON list of
+command line arguments or object {"params": "key=value;text;content", "format":
+"PDF"}. Responses contain rendered file.
+"""
+
+	parser = parser_class(description="Generate qr code", **kwargs)
+	parser.add_argument('text', nargs='*', type=str, help="Input texts or stdin if omitted, each text is drawn as separate code")
+	parser.add_argument('--input-file', type=str, help="Read texts from file (or stdin if value is -), one text on each line")
+	parser.add_argument('--null', action='store_true', help="Texts in input file or stdin are separated by NUL character")
 	parser.add_argument('--outfile', nargs='?', help="Output file or stdout if omitted")
 	parser.add_argument('--base64', action='store_true', help="Base64 encoded text")
+	parser.add_argument('--no-base64', dest='base64', action='store_false')
 	parser.add_argument('--compress', action='store_true', help="PDF compression (default enabled)")
 	parser.add_argument('--no-compress', dest='compress', action='store_false')
 	parser.add_argument('--version', type=int, help="QR code version")
@@ -230,63 +1014,72 @@ draw call.
 	parser.add_argument('--fg', type=str, help="Foreground color")
 	parser.add_argument('--bg', type=str, help="Background color")
 	parser.add_argument('--invert', action='store_true', help="Invert")
+	parser.add_argument('--no-invert', dest='invert', action='store_false')
 	parser.add_argument('--negative', action='store_true', help="Render negative")
+	parser.add_argument('--no-negative', dest='negative', action='store_false')
 	parser.add_argument('--radius', type=float, help="Round code (radius)", default=0.0)
 	parser.add_argument('--enhanced-path', action='store_true', help="Enhanced path rendering")
 	parser.add_argument('--no-enhanced-path', dest='enhanced_path', action='store_false')
+	parser.add_argument('--draw-mode', type=str, choices=['path', 'rects'], help="Draw outlines of shapes (path, default) or merged rectangles of square modules (rects)")
 	parser.add_argument('--gradient', type=parse_gradient, help=gradient_help)
 	parser.add_argument('--hole', type=str, help=area_help)
 	parser.add_argument('--draw', type=str, help=draw_help)
-	parser.add_argument('--format', type=str, choices=['PDF', 'EPS', 'SVG', 'PNG', 'GIF', 'JPG', 'TIFF', 'BMP', 'PPM'], default='PDF', help="Output image format")
+	parser.add_argument('--format', type=str, choices=OUTPUT_FORMATS, default='PDF', help="Output image format")
+	parser.add_argument('--page-size', type=parse_page_size, help="Tile codes to pages of this size, name (e.g. A4) or width:height, without this option each code is drawn to own page")
+	parser.add_argument('--margin', type=toLength, default='1cm', help="Page margin of tiled codes")
+	parser.add_argument('--gutter', type=toLength, default='5mm', help="Space between tiled codes")
+	parser.add_argument('--batch', type=str, help=batch_help)
+	parser.add_argument('--batch-format', type=str, choices=['lines', 'jsonl'], default='lines', help="Format of batch file")
+	parser.add_argument('--outdir', type=str, help="Output directory for batch mode, each record is written to separate file")
+	parser.add_argument('--jobs', type=int, help="Number of worker processes in batch mode (default is number of CPUs)")
+	parser.add_argument('--serve', type=str, help=serve_help)
+	parser.add_argument('--matrix-cache', type=str, help="Directory of persistent cache of encoded codes, can be shared between runs and processes")
 	parser.set_defaults(compress=True)
 	parser.set_defaults(enhanced_path=None)
+	return parser
+
+
+def main():
+	parser = create_parser()
 
 	# split arguments with draw command
-	arg_list = []
-	arg_lists = [arg_list]
-	for arg in sys.argv[1:]:
-		if arg == '--draw' or arg.startswith('--draw='):
-			arg_list = ['--draw']
-			arg_lists.append(arg_list)
-			if arg.startswith('--draw='):
-				arg_list.append(arg[7:])
-		else:
-			arg_list.append(arg)
+	arg_lists = split_draw_arguments(sys.argv[1:])
 
 	base_args = vars(parser.parse_args(arg_lists[0]))
-	text = base_args.pop('text')
+	texts = base_args.pop('text')
 	image_format = base_args.pop('format')
-	if base_args.get('gradient') and image_format != 'PDF':
-		raise ValueError("Gradient is supported only for PDF format")
-	if text is None:
-		text = sys.stdin.read()
+	check_format(base_args, image_format)
+	if base_args['serve']:
+		if texts or base_args['input_file'] or base_args['batch']:
+			raise ValueError("Text, --input-file or --batch can't be used with --serve")
+		run_server(base_args)
+		return
+	if base_args['batch']:
+		if texts or base_args['input_file']:
+			raise ValueError("Text or --input-file can't be used with --batch")
+		run_batch(parser, arg_lists, base_args, image_format)
+		return
+	separator = '\0' if base_args['null'] else '\n'
+	if base_args['input_file'] == '-':
+		texts += read_texts(sys.stdin, separator)
+	elif base_args['input_file']:
+		with open(base_args['input_file'], 'r', encoding='utf-8') as fp:
+			texts += read_texts(fp, separator)
+	elif not texts:
+		texts = read_texts(sys.stdin, '\0') if base_args['null'] else [sys.stdin.read()]
 	if base_args['base64']:
-		text = b64decode(text)
+		texts = [b64decode(text) for text in texts]
+	check_format(base_args, image_format, len(texts))
 
-	if not base_args['outfile'] or base_args['outfile'] == '-':
-		output = sys.stdout.buffer
-	else:
-		output = open(base_args['outfile'], 'wb')
-
-	if image_format == 'PDF':
-		c = canvas.Canvas(
-			output,
-			pageCompression=1 if base_args['compress'] else 0
-		)
-	else:
-		c = CanvasAdapter(output, image_format)
+	output = open_output(base_args['outfile'])
+	c = create_canvas(output, image_format, base_args['compress'])
 
 	try:
-		if len(arg_lists) == 1:
-			generate(text, c, **base_args)
-		else:
-			for arg_list in arg_lists[1:]:
-				arguments = vars(parser.parse_args(arg_list))
-				arguments.pop('text')
-				args = deepcopy(base_args)
-				args.update(arguments)
-				generate(text, c, **args)
-		c.showPage()
+		layers = parse_layers(parser, arg_lists)
+		layout = create_layout(c, base_args)
+		for text in texts:
+			layout.draw(build_codes(text, layers))
+		layout.finish()
 		c.save()
 	finally:
 		if output is not sys.stdout.buffer:
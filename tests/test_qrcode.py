@@ -1,13 +1,43 @@
 # -*- coding: utf-8 -*-
 import array
+import asyncio
+import io
 import math
+import os
+import json
+import pickle
+import re
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from copy import deepcopy
+from dataclasses import FrozenInstanceError
 
 import pytest
 from reportlab.lib.units import toLength
+from reportlab.graphics import renderPM
+from reportlab.graphics.shapes import Drawing
+from reportlab.graphics.transform import transformPoint
+from reportlab.graphics.utils import RenderPMError
+from reportlab.lib.colors import toColor
 from reportlab.pdfgen import canvas
 
-from reportlab_qr_code import qr, qr_draw, reportlab_image_factory, build_qrcode, parse_params_string, ReportlabImageBase
+import reportlab_qr_code
+from reportlab_qr_code.__main__ import CanvasAdapter, SvgCanvas, TileLayout, draw_code, create_server, main, render_request, serve_stream
+from reportlab_qr_code import qr, qr_draw, qr_draw_many, qr_draw_sheets, grid_positions, reportlab_image_factory, build_qrcode, QRStyle, parse_params_string, ReportlabImageBase, DIRECTION, DIRECTION_TURNS_CHECKS, GeometryCache, MatrixCache, PackedBitmap, RenderStats, instrument, AsyncRenderer, QRGeometry, build_geometry, qr_render_async
+
+
+@pytest.fixture(params=['array', 'numpy', 'packed'])
+def bitmap_backend(request, monkeypatch):
+	if request.param == 'numpy':
+		pytest.importorskip('numpy')
+	monkeypatch.setattr(ReportlabImageBase, 'use_numpy', request.param == 'numpy')
+	monkeypatch.setattr(ReportlabImageBase, 'use_packed_bitmap', request.param == 'packed')
+	return request.param
 
 
 def get_canvas():
@@ -46,6 +76,13 @@ def test_wrong_type():
 	c = get_canvas()
 	with pytest.raises(ValueError, match=r"Wrong value .*"):
 		qr(c, 'radius=z;text;Text')
+	# colors and padding are validated before drawing
+	for params in ('fg=nocolor', 'bg=notacolor', 'padding=abc', 'padding=x%'):
+		with pytest.raises(ValueError, match=r"Wrong value .*"):
+			QRStyle.from_string(params)
+	for params in ('fg=red,bg=#ff000080', 'padding=10%', 'padding=3mm', 'padding=2'):
+		QRStyle.from_string(params)
+	QRStyle.from_kwargs(bg=None)
 
 
 def test_base64():
@@ -162,7 +199,7 @@ def test_mixed_units():
 		qr(c, 'hole=1cm:2cm:3:4%;text;Text')
 
 
-def test_area():
+def test_area(bitmap_backend):
 	qr(get_canvas(), 'hole=0cm:0cm:5cm:5cm,size=5cm;text;Area')
 	img = build_qrcode(*parse_params_string('hole=0cm:0cm:5cm:5cm,size=5cm;text;Area'))
 	assert img.hole == [(0, 0, img.width, img.width)]
@@ -195,9 +232,11 @@ def get_draw_part_state(img, index=0) -> ReportlabImageBase:
 def test_unknown_area():
 	with pytest.raises(ValueError, match=r"Unknown area .*"):
 		get_draw_part_state(build_qrcode(*parse_params_string('draw=notexist;text;All')))
+	with pytest.raises(ValueError, match=r"Unknown area .*"):
+		build_qrcode(*parse_params_string(';text;All')).get_fragment_area('notexist')
 
 
-def test_draw_all():
+def test_draw_all(bitmap_backend):
 	original_bitmap = build_qrcode(*parse_params_string(';text;All')).bitmap
 	all_image = get_draw_part_state(build_qrcode(*parse_params_string('draw=all;text;All')))
 	all_image_with_operator = get_draw_part_state(build_qrcode(*parse_params_string('draw=+all;text;All')))
@@ -207,14 +246,14 @@ def test_draw_all():
 	assert sum(empty.bitmap) == 0
 
 
-def test_draw_eye():
+def test_draw_eye(bitmap_backend):
 	original_bitmap = build_qrcode(*parse_params_string(';text;All')).bitmap
 	eye = get_draw_part_state(build_qrcode(*parse_params_string('draw=eyepupil1;text;All')))
 	assert original_bitmap != eye.bitmap
 	assert sum(eye.bitmap) == 9
 
 
-def test_combined_eye():
+def test_combined_eye(bitmap_backend):
 	eyeball = get_draw_part_state(build_qrcode(*parse_params_string('draw=eyeball1;text;T')))
 	eyepupil = get_draw_part_state(build_qrcode(*parse_params_string('draw=eyepupil1;text;T')))
 	eye = get_draw_part_state(build_qrcode(*parse_params_string('draw=eye1;text;T')))
@@ -232,6 +271,103 @@ def test_combined_eye():
 	eyepupil_combined = get_draw_part_state(build_qrcode(*parse_params_string('draw=eye1-eyeballs;text;T')))
 
 
+def test_part_bitmap(bitmap_backend):
+	img = build_qrcode(*parse_params_string('version=7,draw=all-eyes-align,draw=eyes,draw=alignballs,draw=-all;text;T'))
+	bitmap = deepcopy(img.bitmap)
+	part_segments = img.get_part_segments()
+	assert img.bitmap == bitmap # base bitmap is not modified
+
+	for index, part in enumerate(img.draw_parts):
+		assert get_draw_part_state(img, index).get_segments() == part_segments[index]
+		img.begin_part(part)
+		img.finish_part()
+		assert img.bitmap == bitmap
+
+	# masks are computed once for each version
+	assert img.get_draw_mask(img.draw_parts[0]['draw']) is img.get_draw_mask(img.draw_parts[0]['draw'])
+	assert img.get_draw_mask([('+', 'all')]) is None
+	assert part_segments[3] == []
+
+	# cache of masks is bounded, draw operations can come from requests
+	reportlab_qr_code.get_draw_mask.cache_clear()
+	operations = [('+', 'eyes'), ('-', 'eye1'), ('+', 'align'), ('-', 'alignballs')]
+	for count in range(reportlab_qr_code.DRAW_MASK_CACHE_SIZE + 10):
+		img.get_draw_mask(operations * (count + 1))
+	assert reportlab_qr_code.get_draw_mask.cache_info().currsize == reportlab_qr_code.DRAW_MASK_CACHE_SIZE
+
+
+@pytest.fixture
+def custom_areas(monkeypatch):
+	monkeypatch.setattr(reportlab_qr_code, 'AREAS', reportlab_qr_code.AREAS.copy())
+	yield
+	monkeypatch.undo()
+	reportlab_qr_code.get_area_index.cache_clear()
+	reportlab_qr_code.get_draw_mask.cache_clear()
+
+
+def test_area_index():
+	for version in range(1, 41):
+		width = version * 4 + 17
+		index = reportlab_qr_code.get_area_index(width)
+		assert index is reportlab_qr_code.get_area_index(width)
+		for name, area in index.items():
+			assert bin(area.mask).count('1') == sum(w * h for x, y, w, h in area.rectangles), name
+		assert len(index['align'].rectangles) == max(len(reportlab_qr_code.ALIGN_POSITION_TABLE[version - 1]) ** 2 - 3, 0)
+		assert index['eyes'].mask == index['eye1'].mask | index['eye2'].mask | index['eye3'].mask
+	assert reportlab_qr_code.get_area_index(21)['eye2'].rectangles == ((14, 0, 7, 7),)
+	assert reportlab_qr_code.get_area_index(5)['eye2'].rectangles == ((0, 0, 5, 5),) # clipped
+
+
+def test_register_area(bitmap_backend, custom_areas):
+	reportlab_qr_code.register_area('corner', [(0, 0, 2, 2)])
+	reportlab_qr_code.register_area('center', lambda width: [(width // 2, width // 2, 1, 1)])
+	corner = get_draw_part_state(build_qrcode(*parse_params_string('draw=corner;text;T')))
+	assert sum(corner.bitmap) == 3 # corner of eye ring
+	center = get_draw_part_state(build_qrcode(*parse_params_string('draw=all-center-eye1;text;T')))
+	original = build_qrcode(*parse_params_string(';text;T'))
+	assert sum(center.bitmap) == sum(original.bitmap) - 33 - original.bitmap[original.width * 10 + 10]
+	assert original.get_fragment_area('corner') == [(0, 0, 2, 2)]
+	assert (original.get_version(), original.get_align_positions()) == (1, [])
+
+	with pytest.raises(ValueError, match=r"Area corner already exists"):
+		reportlab_qr_code.register_area('corner', [(0, 0, 1, 1)])
+	with pytest.raises(ValueError, match=r"Wrong area name.*"):
+		reportlab_qr_code.register_area('a-b', [(0, 0, 1, 1)])
+
+
+@pytest.mark.parametrize('params', [
+	'version=1',
+	'version=10,invert=1',
+	'version=7,hole=30%:30%:40%:40%,error_correction=H',
+	'draw=all-eyes,draw=eyes',
+])
+def test_rects(bitmap_backend, params):
+	img = build_qrcode(*parse_params_string(f'draw_mode=rects,{params};text;Rects'))
+	bitmap = deepcopy(img.bitmap)
+	img.clear_area()
+	for part, rects in zip(img.draw_parts, img.get_part_segments()):
+		# rectangles cover exactly modules of part without overlapping
+		covered = bytearray(img.width * img.width)
+		for area in rects:
+			img.fill_area(covered, area, 1)
+		assert sum(w * h for x, y, w, h in rects) == sum(covered)
+		assert covered == bytes(get_draw_part_state(img, img.draw_parts.index(part)).bitmap)
+		assert rects == sorted(rects, key=lambda rect: (rect[1], rect[0]))
+	assert build_qrcode(*parse_params_string(f'{params};text;Rects')).bitmap == bitmap
+
+	rects = img.get_rects()
+	assert len(rects) < sum(img.bitmap) # adjacent modules are merged
+	assert img.draw_rects(canvas.Canvas(None).beginPath(), rects).getCode().count(' re') == len(rects)
+
+
+def test_draw_mode():
+	with pytest.raises(ValueError, match=r".*Unknown draw mode `circles`, expected one of path, rects"):
+		qr(get_canvas(), 'draw_mode=circles;text;Text')
+	img = build_qrcode(*parse_params_string('draw=eyes,draw_mode=rects;text;T'))
+	assert (img.draw_mode, get_draw_part_state(img).draw_mode) == ('path', 'rects')
+	qr(get_canvas(), 'draw_mode=rects,mask=1;text;Text')
+
+
 def test_dont_allow_override_global_options_in_part():
 	img = build_qrcode(*parse_params_string('radius=0,padding=0,draw=eye1,radius=1,padding=1;text;T'))
 	eye = get_draw_part_state(img)
@@ -241,7 +377,7 @@ def test_dont_allow_override_global_options_in_part():
 	assert img.padding == 0 # don't allow change padding
 
 
-def test_segments():
+def test_segments(bitmap_backend):
 	eyeball1 = get_draw_part_state(build_qrcode(*parse_params_string(f'draw=eyeball1;text;T')))
 	eyepupil1 = get_draw_part_state(build_qrcode(*parse_params_string(f'draw=eyepupil1;text;T')))
 	eye1 = get_draw_part_state(build_qrcode(*parse_params_string(f'draw=eye1;text;T')))
@@ -352,6 +488,181 @@ def test_segment_inside():
 	]
 
 
+def consume_reference_segment(img):
+	"""
+	Original tracer, which inverts area of every traced shape
+	"""
+	line_intersections = [[] for __ in range(img.width)]
+
+	try:
+		coords = img.coord(img.bitmap.index(1))
+	except ValueError:
+		return
+
+	def move():
+		nonlocal coords
+		step = DIRECTION[direction]
+		if step[1]:
+			line = coords[1]
+			if step[1] == -1:
+				line -= 1
+			line_intersections[line].append(coords[0])
+		coords += step
+
+	path = [tuple(coords)]
+	direction = 0
+	clockwiese = 1
+	move()
+
+	while coords != path[0]:
+		if img.bitmap_get(coords + DIRECTION_TURNS_CHECKS[(direction - max(0, clockwiese)) % 4]):
+			if img.enhanced_path:
+				if not img.bitmap_get(coords + DIRECTION_TURNS_CHECKS[(direction + min(0, clockwiese)) % 4]):
+					move()
+					clockwiese = -clockwiese
+					continue
+			path.append(tuple(coords))
+			direction = (direction - clockwiese) % 4
+			move()
+			continue
+		if img.bitmap_get(coords + DIRECTION_TURNS_CHECKS[(direction + min(0, clockwiese)) % 4]):
+			move()
+			continue
+		path.append(tuple(coords))
+		direction = (direction + clockwiese) % 4
+		move()
+
+	path.append(tuple(coords))
+
+	for row, line in enumerate(line_intersections):
+		line = sorted(line)
+		for start, end in zip(line[::2], line[1::2]):
+			for col in range(start, end):
+				img.bitmap_invert((col, row))
+
+	return path
+
+
+def get_reference_segments(img):
+	img = deepcopy(img)
+	segments = []
+	segment = consume_reference_segment(img)
+	while segment:
+		segments.append(segment)
+		segment = consume_reference_segment(img)
+	return segments
+
+
+@pytest.mark.parametrize('enhanced_path', [0, 1])
+@pytest.mark.parametrize('error_correction', ['L', 'M', 'Q', 'H'])
+@pytest.mark.parametrize('version', range(1, 41))
+def test_segments_match_reference(version, error_correction, enhanced_path):
+	img = build_qrcode(*parse_params_string(f'version={version},error_correction={error_correction},enhanced_path={enhanced_path};text;Reference'))
+	img.clear_area()
+	assert img.get_segments() == get_reference_segments(img)
+
+
+def test_segments_intersections_match_reference():
+	bitmap = array.array('B', [
+		1, 0, 1, 0,
+		0, 1, 0, 1,
+		1, 1, 0, 0,
+		0, 1, 0, 1,
+	])
+	for enhanced_path in (False, True):
+		img = draw_image(bitmap)
+		img.enhanced_path = enhanced_path
+		assert img.get_segments() == get_reference_segments(img)
+
+
+def test_iter_segments():
+	img = build_qrcode(*parse_params_string('version=10;text;Lazy'))
+	segments = img.iter_segments()
+	first = next(segments)
+	assert [first, *segments] == img.get_segments()
+
+
+@pytest.mark.parametrize('params', [
+	'radius=0.5,draw=all-eyes,draw=eyes,draw_mode=rects;text;Lazy',
+	'mask=1,negative=1;text;Lazy',
+])
+def test_lazy_save(monkeypatch, params):
+	img = build_qrcode(*parse_params_string(params))
+	lazy = get_pdf_content(img.save)
+	assert img.part_segments is None
+	assert img.draw_state_stack == []
+	assert img.get_part_segments() is img.get_part_segments()
+	assert get_pdf_content(img.save) == lazy
+	# path API consumes generators too
+	monkeypatch.setattr(ReportlabImageBase, 'use_fast_path', False)
+	img.part_segments = None
+	assert get_pdf_content(img.save) == lazy
+
+
+def test_bitmap_backends_equal(monkeypatch):
+	pytest.importorskip('numpy')
+	params = 'version=10,invert=1,hole=20%:40%:60%:20%,draw=all-eyes-alignpupils+eyepupil2,draw=eyeballs;text;Backends'
+	bitmaps = []
+	for use_numpy, use_packed_bitmap in ((False, False), (True, False), (True, True)):
+		monkeypatch.setattr(ReportlabImageBase, 'use_numpy', use_numpy)
+		monkeypatch.setattr(ReportlabImageBase, 'use_packed_bitmap', use_packed_bitmap)
+		img = build_qrcode(*parse_params_string(params))
+		img.clear_area()
+		bitmaps.append([img.bitmap] + [get_draw_part_state(img, index).bitmap for index in range(len(img.draw_parts))])
+	assert bitmaps[0] == bitmaps[1]
+	assert [bytes(bitmap) for bitmap in bitmaps[0]] == [bytes(bitmap) for bitmap in bitmaps[2]]
+	assert all(isinstance(bitmap, array.array) for bitmap in bitmaps[1])
+	assert all(isinstance(bitmap, PackedBitmap) for bitmap in bitmaps[2])
+
+
+def test_packed_bitmap():
+	bitmap = PackedBitmap.from_bytes(bytes([1, 0, 0, 1, 1]))
+	assert (len(bitmap), bitmap.value) == (5, 0b10011)
+	assert list(bitmap) == [1, 0, 0, 1, 1]
+	assert [bitmap[addr] for addr in range(5)] == [1, 0, 0, 1, 1]
+	bitmap[0] = 0
+	bitmap[1] = 1
+	assert bytes(bitmap) == bytes([0, 1, 0, 1, 1])
+	assert sum(bitmap) == 3
+
+
+def test_packed_bitmap_hole_outside(monkeypatch):
+	monkeypatch.setattr(ReportlabImageBase, 'use_packed_bitmap', True)
+	img = build_qrcode(*parse_params_string('hole=22:0:5:5,version=1;text;Hole'))
+	bitmap = bytes(img.bitmap)
+	img.clear_area()
+	assert bytes(img.bitmap) == bitmap
+
+
+@pytest.mark.parametrize('hole, cleared', [
+	('21:3:2:2', None),
+	('120%:10%:10%:10%', None),
+	('3:22:2:2', None),
+	('19:18:5:5', (19, 18, 2, 3)),
+])
+def test_hole_clipped(bitmap_backend, hole, cleared):
+	# holes are clipped to code, all backends clear same modules
+	img = build_qrcode(*parse_params_string(f'hole={hole},version=1;text;Hole'))
+	expected = bytearray(bytes(img.bitmap))
+	if cleared is not None:
+		x, y, w, h = cleared
+		for row in range(y, y + h):
+			expected[row * img.width + x:row * img.width + x + w] = bytes(w)
+	img.clear_area()
+	assert bytes(img.bitmap) == bytes(expected)
+
+
+def test_load_modules_same_as_drawrect(bitmap_backend):
+	for invert in (0, 1):
+		img = build_qrcode(*parse_params_string(f'invert={invert};text;Bulk'))
+		drawn = reportlab_image_factory(invert=invert)(border=0, width=img.width, box_size=1, qrcode_modules=img.modules)
+		for row, line in enumerate(img.modules):
+			for col, module in enumerate(line):
+				if module:
+					drawn.drawrect(row, col)
+		assert drawn.bitmap == img.bitmap
+
+
 def test_python_api():
 	c = get_canvas()
 	qr_draw(c, "Text")
@@ -367,7 +678,620 @@ def test_python_api_offset():
 	qr_draw(c, "Text", x="1cm", y="1cm", size=5, padding=5)
 
 
-def test_inverted():
+def get_pdf_content(draw):
+	c = canvas.Canvas(None, pageCompression=0, invariant=1)
+	draw(c)
+	c.showPage()
+	return c.getpdfdata()
+
+
+def test_geometry_cache():
+	cache = GeometryCache()
+	params = 'radius=0.5,draw=all-eyes,draw=eyes,fg=#ff0000;text;Cached'
+	uncached = get_pdf_content(lambda c: qr(c, params))
+	first = get_pdf_content(lambda c: qr(c, params, cache=cache))
+	assert (cache.hits, cache.misses, len(cache)) == (0, 1, 1)
+	second = get_pdf_content(lambda c: qr(c, params, cache=cache))
+	assert (cache.hits, cache.misses, len(cache)) == (1, 1, 1)
+	assert uncached == first == second
+	assert cache.get_key(*parse_params_string(params)) in cache.entries
+
+	# style is not part of key
+	qr(get_canvas(), 'radius=0.5,draw=all-eyes,draw=eyes,fg=#0000ff;text;Cached', cache=cache)
+	assert (cache.hits, cache.misses, len(cache)) == (2, 1, 1)
+
+	# parameters affecting geometry
+	for params in ('invert=1;text;Cached', 'hole=10%:10%:10%:10%;text;Cached', 'hole=10%:10%:10%:10%,size=3cm;text;Cached', ';text;Other', 'draw_mode=rects;text;Other'):
+		qr(get_canvas(), params, cache=cache)
+	assert (cache.hits, cache.misses, len(cache)) == (2, 6, 6)
+
+	cache.clear()
+	assert (cache.hits, cache.misses, len(cache), cache.size) == (0, 0, 0, 0)
+
+
+@pytest.mark.parametrize('params', ['radius=0.5,draw=all-eyes,draw=eyes', 'invert=1,hole=30%:30%:40%:40%', 'draw_mode=rects,hole=2:2:3:3'])
+def test_cached_image(bitmap_backend, params, tmp_path):
+	cache = GeometryCache()
+	style, text = parse_params_string(f'{params};text;Cached')
+	uncached = build_qrcode(style, text)
+	uncached.get_part_segments() # holes are cleared before tracing
+	expected = (bytes(uncached.bitmap), uncached.get_segments(), uncached.get_rects(), uncached.get_part_segments(), uncached.get_modules_bitmap())
+	uncached_path = uncached.draw_code(get_canvas().beginPath())._code
+	for __ in range(2):
+		for img in (build_qrcode(style, text, cache, str(tmp_path)), build_qrcode(style, text, None, str(tmp_path))):
+			assert img.get_part_segments() is not None
+			assert (bytes(img.bitmap), img.get_segments(), img.get_rects(), img.get_part_segments(), img.get_modules_bitmap()) == expected
+			assert img.draw_code(get_canvas().beginPath())._code == uncached_path
+	assert cache.hits == 1
+
+
+def test_geometry_cache_eviction():
+	cache = GeometryCache(max_size=60)
+	cache.put('a', 1, [[[(0, 0)] * 20]])
+	cache.put('b', 1, [[[(0, 0)] * 20]])
+	cache.put('a', 1, [[[(0, 0)] * 30]])
+	assert cache.size == 50
+	cache.put('c', 1, [[[(0, 0)] * 20]])
+	assert list(cache.entries) == ['a', 'c']
+	assert cache.size == 50
+	assert cache.get('b') is None
+	cache.put('d', 1, [[[(0, 0)] * 100]])
+	assert len(cache) == 0
+
+
+def test_geometry_cache_api(monkeypatch):
+	geometry_cache = GeometryCache()
+	monkeypatch.setattr(reportlab_qr_code, 'geometry_cache', geometry_cache)
+	uncached = get_pdf_content(lambda c: qr_draw(c, 'Text', radius=1))
+	cached = get_pdf_content(lambda c: qr_draw(c, 'Text', radius=1, cache=True))
+	assert uncached == cached
+	assert len(geometry_cache) == 1
+	qr(get_canvas(), 'cache=1;text;Text')
+	assert len(geometry_cache) == 2
+	qr(get_canvas(), 'cache=0;text;Other')
+	assert len(geometry_cache) == 2
+
+
+def test_matrix_cache(tmp_path):
+	cache = MatrixCache(tmp_path)
+	params = 'version=5,radius=0.5,draw=all-eyes,draw=eyes;text;Cached'
+	uncached = get_pdf_content(lambda c: qr(c, params))
+	first = get_pdf_content(lambda c: qr(c, params, matrix_cache=cache))
+	assert (cache.hits, cache.misses, len(cache.get_files())) == (0, 1, 1)
+	second = get_pdf_content(lambda c: qr(c, params, matrix_cache=cache))
+	assert (cache.hits, cache.misses) == (1, 1)
+	assert uncached == first == second
+
+	# only data, version and error correction are part of key
+	for invert in (0, 1):
+		img = build_qrcode(*parse_params_string(f'version=5,invert={invert},hole=1:1:4:4;text;Cached'), matrix_cache=cache)
+		assert img.bitmap == build_qrcode(*parse_params_string(f'version=5,invert={invert},hole=1:1:4:4;text;Cached')).bitmap
+	qr(get_canvas(), 'version=5,error_correction=H;text;Cached', matrix_cache=cache)
+	assert (cache.hits, cache.misses, len(cache.get_files())) == (3, 2, 2)
+
+	cache.clear()
+	assert (cache.hits, cache.misses, len(cache.get_files()), cache.size) == (0, 0, 0, 0)
+
+
+def test_matrix_cache_api(tmp_path):
+	directory = tmp_path / 'matrices'
+	texts = [f'Code {num % 3}' for num in range(6)]
+	uncached = get_pdf_content(lambda c: qr_draw_sheets(c, texts, 2, 2, '2cm', '2cm', size='2cm'))
+	cached = get_pdf_content(lambda c: qr_draw_sheets(c, texts, 2, 2, '2cm', '2cm', size='2cm', matrix_cache=str(directory)))
+	assert uncached == cached
+	cache = reportlab_qr_code.get_matrix_cache(directory)
+	assert cache is reportlab_qr_code.get_matrix_cache(str(directory))
+	assert (cache.hits, cache.misses) == (3, 3)
+	qr_draw(get_canvas(), 'Code 0', form=True, matrix_cache=directory)
+	qr_draw(get_canvas(), 'Code 0', matrix_cache=directory)
+	assert (cache.hits, cache.misses) == (5, 3)
+
+
+def test_matrix_cache_eviction(tmp_path):
+	cache = MatrixCache(tmp_path, max_size=200)
+	modules = bytes(21 * 21)
+	file_size = len(cache.pack(21, modules))
+	for num, name in enumerate(['a.qrm', 'b.qrm', 'c.qrm']):
+		cache.put(name, 21, modules)
+		os.utime(tmp_path / name, ns=(num * 10 ** 9, num * 10 ** 9))
+	assert cache.size == 3 * file_size
+	# read updates access time
+	assert cache.get('a.qrm') == (21, modules)
+	cache.put('d.qrm', 21, modules)
+	assert sorted(entry.name for entry in cache.get_files()) == ['a.qrm', 'c.qrm', 'd.qrm']
+	assert cache.size == 3 * file_size
+	assert cache.get('b.qrm') is None
+	cache.max_size = 0
+	cache.evict()
+	assert (len(cache.get_files()), cache.size) == (0, 0)
+
+
+def test_matrix_cache_shared_size(tmp_path):
+	# each process counts only own writes, directory is scanned periodically
+	modules = bytes(21 * 21)
+	file_size = len(MatrixCache(tmp_path).pack(21, modules))
+	max_size = file_size * 32
+	caches = [MatrixCache(tmp_path, max_size=max_size) for __ in range(4)]
+	for num in range(200):
+		caches[num % len(caches)].put(f'{num}.qrm', 21, modules)
+		total = sum(entry.stat().st_size for entry in caches[0].get_files())
+		assert total <= max_size + len(caches) * (max_size // MatrixCache.SCAN_DIVISOR + file_size)
+
+
+def test_matrix_cache_utime_error(tmp_path, monkeypatch):
+	cache = MatrixCache(tmp_path)
+	modules = bytes(21 * 21)
+	cache.put('a.qrm', 21, modules)
+
+	def utime(path, *args, **kwargs):
+		raise PermissionError(path)
+	monkeypatch.setattr(os, 'utime', utime)
+	assert cache.get('a.qrm') == (21, modules)
+	assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_matrix_cache_corrupted(tmp_path, monkeypatch):
+	cache = MatrixCache(tmp_path)
+	modules = bytes([1, 0, 0, 1]) * 110 + bytes([1])
+	data = cache.pack(21, modules)
+	assert cache.unpack(data) == (21, modules)
+	with pytest.raises(ValueError, match="Modules don't match"):
+		cache.pack(22, modules)
+	for name, content in [('empty.qrm', b''), ('short.qrm', data[:3]), ('magic.qrm', b'XXXX' + data[4:]), ('truncated.qrm', data[:-1]), ('bits.qrm', data[:5] + b'\xff' + data[6:])]:
+		(tmp_path / name).write_bytes(content)
+		assert cache.get(name) is None
+	assert cache.get('missing.qrm') is None
+	assert (cache.hits, cache.misses) == (0, 6)
+
+	# failed write doesn't leave temporary file
+	def replace(src, dst):
+		raise PermissionError(dst)
+	monkeypatch.setattr(os, 'replace', replace)
+	cache.put('failed.qrm', 21, modules)
+	assert not list(tmp_path.glob('*.tmp'))
+	assert cache.get('failed.qrm') is None
+
+
+def render_with_matrix_cache(job):
+	directory, num = job
+	return get_pdf_content(lambda c: qr_draw(c, f'Code {num % 4}', version=10, matrix_cache=MatrixCache(directory, max_size=5000)))
+
+
+def test_matrix_cache_processes(tmp_path):
+	jobs = [(str(tmp_path), num) for num in range(32)]
+	serial = [get_pdf_content(lambda c: qr_draw(c, f'Code {num % 4}', version=10)) for __, num in jobs]
+	with ProcessPoolExecutor(max_workers=4) as executor:
+		concurrent = list(executor.map(render_with_matrix_cache, jobs))
+	assert concurrent == serial
+	assert not list(tmp_path.glob('*.tmp'))
+
+
+@pytest.mark.parametrize('use_fast_path', [True, False])
+def test_instrument(monkeypatch, tmp_path, use_fast_path):
+	monkeypatch.setattr(ReportlabImageBase, 'use_fast_path', use_fast_path)
+	cache = GeometryCache()
+	style = QRStyle.from_kwargs(radius=0.5, hole='40%:40%:20%:20%', draw_parts=[{'draw': 'all-eyes'}, {'draw': 'eyes', 'radius': 0}])
+	qr_draw(get_canvas(), 'Other', style=style)
+	with instrument() as stats:
+		qr_draw(get_canvas(), 'Text', style=style, cache=cache, matrix_cache=tmp_path)
+		qr_draw(get_canvas(), 'Text', style=style, cache=cache)
+		qr_draw(get_canvas(), 'Text', style=style, matrix_cache=tmp_path)
+	data = stats.as_dict()
+	assert set(data['timings']) == {'encode', 'load', 'matrix_cache', 'mask', 'trace', 'emit'}
+	assert all(value > 0 for value in data['timings'].values())
+
+	part_segments = build_qrcode(style, b'Text').get_part_segments()
+	tokens = get_pdf_content(lambda c: qr_draw(c, 'Text', style=style)).decode('latin-1').split()
+	assert data['counters'] == {
+		'codes': 3,
+		'saves': 3,
+		'geometry_cache_hits': 1,
+		'geometry_cache_misses': 1,
+		'matrix_cache_hits': 1,
+		'matrix_cache_misses': 1,
+		'segments': 2 * sum(len(segments) for segments in part_segments),
+		'path_operators': 3 * sum(tokens.count(operator) for operator in ('m', 'l', 'c', 'h')),
+	}
+
+	# nothing is recorded outside of with block
+	qr_draw(get_canvas(), 'Text', style=style)
+	assert stats.as_dict() == data
+	stats.clear()
+	assert stats.as_dict() == {'timings': {}, 'counters': {}}
+
+
+def test_instrument_threads():
+	stats = RenderStats()
+
+	def render(num):
+		with instrument(stats):
+			qr_draw(get_canvas(), f'Text {num}', draw_mode='rects')
+
+	with ThreadPoolExecutor(max_workers=4) as executor:
+		list(executor.map(render, range(8)))
+	counters = stats.as_dict()['counters']
+	assert (counters['codes'], counters['saves'], counters['segments']) == (8, 8, counters['path_operators'])
+
+
+def test_form():
+	def draw(c, **kwargs):
+		for page in range(5):
+			qr_draw(c, 'Footer', x=page, y='1cm', size='2cm', fg='#ff0000', **kwargs)
+			qr(c, 'radius=0.5,size=2cm;text;Other', **kwargs)
+			c.showPage()
+		qr_draw(c, 'Footer', x=0, y='1cm', size='2cm', fg='#0000ff', **kwargs)
+
+	inline = get_pdf_content(lambda c: draw(c))
+	forms = get_pdf_content(lambda c: draw(c, form=True))
+	assert len(forms) < len(inline) / 2
+	assert forms.count(b'/Subtype /Form') == 3
+	assert forms.count(b' Do') == 11
+
+	forms = get_pdf_content(lambda c: qr(c, 'form=1;text;Footer'))
+	assert forms.count(b'/Subtype /Form') == 1
+
+	# alpha must be available in form resources
+	forms = get_pdf_content(lambda c: qr(c, 'form=1,fg=#00000080;text;Footer'))
+	assert b'/ExtGState' in forms
+
+	# form sets all used alpha values, it doesn't depend on alpha of page
+	def draw_alpha(c):
+		c.setFillAlpha(0.5)
+		qr(c, 'form=1,bg=#ff000040,draw=all-eyes,draw=eyes,fg=#00ff00;text;Footer')
+		qr(c, 'form=1,fg=#0000ff80;text;Footer')
+	forms = get_pdf_content(draw_alpha).decode('latin-1')
+	assert re.findall(r'/(QRa\d) gs', forms) == ['QRa0', 'QRa1', 'QRa1', 'QRa0']
+	states = [re.findall(r'/(QRa\d) <<\s*/ca ([\d.]+)', resources) for resources in re.findall(r'/ExtGState <<(.*?)>>\s*>>', forms, re.S)]
+	assert states[:2] == [[('QRa0', '.25098'), ('QRa1', '1')], [('QRa0', '.501961')]]
+
+
+def test_form_mask():
+	with pytest.raises(ValueError, match=r".*can't be rendered as form"):
+		qr(get_canvas(), 'mask=1,form=1;text;Mask')
+
+
+def test_draw_many():
+	style = {'size': '2cm', 'radius': 0.5, 'draw_parts': [{'draw': 'all-eyes'}, {'draw': 'eyes', 'fg': '#ff0000'}]}
+	items = [('First', 0, 0), (b'Second', '3cm', 0), ('Third', 0, '3cm', {'fg': '#0000ff', 'version': 5}), ('First', '3cm', '3cm'), ('Fourth', '6cm', 0, {'fg': '#0000ff', 'version': 5})]
+
+	def draw_loop(c):
+		for text, x, y, *overrides in items:
+			qr_draw(c, text, x=x, y=y, **deepcopy({**style, **(overrides[0] if overrides else {})}))
+
+	cache = GeometryCache()
+	loop = get_pdf_content(draw_loop)
+	batch = get_pdf_content(lambda c: qr_draw_many(c, items, **style))
+	batch_cached = get_pdf_content(lambda c: qr_draw_many(c, items, cache=cache, **style))
+	assert loop == batch == batch_cached
+	assert (cache.hits, cache.misses) == (1, 4)
+	assert style['draw_parts'][0] == {'draw': 'all-eyes'} # parameters are not modified
+
+
+def test_style():
+	style = QRStyle.from_kwargs(size='2cm', fg='#ff0000', radius=0.5)
+	assert style == QRStyle.from_kwargs(radius=0.5, fg='#ff0000', size='2cm')
+	assert hash(style) == hash(QRStyle.from_kwargs(radius=0.5, fg='#ff0000', size='2cm'))
+	assert style != style.replace(fg='#0000ff')
+	assert style.replace(fg='#0000ff').raw_params['size'] == '2cm'
+	with pytest.raises(FrozenInstanceError):
+		style.key = ()
+	with pytest.raises(TypeError):
+		style.params['size'] = 1
+
+	# nested parameters are copied and read only
+	draw_parts = [{'draw': 'all-eyes'}, {'draw': 'eyes', 'fg': '#ff0000'}]
+	style = QRStyle.from_kwargs(draw_parts=draw_parts)
+	key = style.key
+	draw_parts[1]['fg'] = '#0000ff'
+	draw_parts.append({'draw': 'eyepupils'})
+	assert style.key == key
+	assert len(style.params['draw_parts']) == len(style.raw_params['draw_parts']) == 2
+	assert style.raw_params['draw_parts'][1]['fg'] == '#ff0000'
+	with pytest.raises(TypeError):
+		style.params['draw_parts'][1]['fg'] = '#0000ff'
+	with pytest.raises(AttributeError):
+		style.raw_params['draw_parts'].append({'draw': 'eyepupils'})
+
+	# compiled only once
+	assert QRStyle.from_string('size=2cm,fg=#ff0000') is QRStyle.from_string('size=2cm,fg=#ff0000')
+	assert QRStyle.from_string('cache=1,form=1').options == {'cache': '1', 'form': '1'}
+	with pytest.raises(ValueError, match=r"Wrong format of parameters.*"):
+		QRStyle.from_string('size')
+
+
+def test_style_draw():
+	string_style = QRStyle.from_string('size=2cm,radius=0.5,draw=all-eyes,draw=eyes,fg=#ff0000')
+	kwargs_style = QRStyle.from_kwargs(size='2cm', radius=0.5, draw_parts=[{'draw': 'all-eyes'}, {'draw': 'eyes', 'fg': '#ff0000'}])
+	expected = get_pdf_content(lambda c: qr(c, 'size=2cm,radius=0.5,draw=all-eyes,draw=eyes,fg=#ff0000;text;Text'))
+	assert get_pdf_content(lambda c: qr(c, ';text;Text', style=string_style)) == expected
+	assert get_pdf_content(lambda c: qr_draw(c, 'Text', style=kwargs_style)) == expected
+	assert get_pdf_content(lambda c: qr_draw_many(c, [('Text', 0, 0)], style=kwargs_style)) == expected
+	assert build_qrcode(kwargs_style, b'Text').bitmap == build_qrcode(*parse_params_string('size=2cm;text;Text')).bitmap
+
+	moved = get_pdf_content(lambda c: qr_draw(c, 'Text', x='1cm', y=5, **kwargs_style.raw_params))
+	assert get_pdf_content(lambda c: qr_draw(c, 'Text', x='1cm', y=5, style=kwargs_style)) == moved
+	assert get_pdf_content(lambda c: qr_draw(c, 'Text', x='1cm', y=5, form=True, style=kwargs_style)) != moved
+
+	with pytest.raises(ValueError, match=r"Parameters size can't be combined with style.*"):
+		qr_draw(get_canvas(), 'Text', style=kwargs_style, size='1cm')
+	with pytest.raises(ValueError, match=r"Parameters 'size=1cm' can't be combined with style"):
+		qr(get_canvas(), 'size=1cm;text;Text', style=kwargs_style)
+
+
+def test_style_pickle():
+	for style in (
+		QRStyle.from_string('cache=1,size=2cm,hole=40%:40%:20%:20%,draw=all-eyes,draw=eyes,fg=#ff000080'),
+		QRStyle.from_kwargs(size='2cm', radius=0.5, draw_parts=[{'draw': 'all-eyes'}, {'draw': 'eyes', 'fg': '#ff0000'}]),
+	):
+		restored = pickle.loads(pickle.dumps(style))
+		assert restored == style
+		assert restored.options == style.options
+		expected = get_pdf_content(lambda c: qr_draw(c, 'Text', style=style))
+		assert get_pdf_content(lambda c: qr_draw(c, 'Text', style=restored)) == expected
+
+
+def test_geometry():
+	style = QRStyle.from_kwargs(size='2cm', radius=0.5, draw_parts=[{'draw': 'all-eyes'}, {'draw': 'eyes', 'fg': '#ff0000'}])
+	geometry = build_geometry(style, b'Text')
+	assert isinstance(geometry, QRGeometry)
+	expected = get_pdf_content(lambda c: qr_draw(c, 'Text', x='1cm', y=5, style=style))
+	assert get_pdf_content(lambda c: geometry.draw(c, x='1cm', y=5)) == expected
+	restored = pickle.loads(pickle.dumps(geometry))
+	assert get_pdf_content(lambda c: restored.draw(c, x='1cm', y=5)) == expected
+	assert get_pdf_content(restored.draw) == get_pdf_content(lambda c: qr_draw(c, 'Text', style=style))
+
+	# coordinates are stored as compact arrays
+	geometry = build_geometry(style.replace(version=20), b'Text')
+	assert len(pickle.dumps(geometry)) * 2 < len(pickle.dumps(geometry.part_segments))
+
+
+@pytest.mark.parametrize('params', [
+	'version=10,radius=0.5',
+	'draw_mode=rects,negative=1,draw=all-eyes,draw=eyes,draw_mode=path,fg=#ff0000',
+	'draw=-all,draw=eyes,draw_mode=rects',
+])
+def test_geometry_arrays(params):
+	style = QRStyle.from_string(params)
+	img = build_qrcode(style, b'Geometry')
+	geometry = QRGeometry.from_segments(style, img.width, img.get_part_segments())
+	assert geometry.part_segments == img.get_part_segments()
+	assert all(isinstance(coords, array.array) for coords in geometry.coords)
+	assert not hasattr(geometry, '__dict__')
+	restored = pickle.loads(pickle.dumps(geometry))
+	assert restored == geometry
+	assert restored != build_geometry(QRStyle.from_string('version=15'), b'Other')
+	assert restored != img
+
+	parts = list(geometry.iter_parts())
+	assert [segments for __, segments in parts] == img.get_part_segments()
+	for (fill, __), index in zip(parts, range(len(img.draw_parts))):
+		state = get_draw_part_state(img, index)
+		assert fill == {'fg': state.fg, 'fg_alpha': state.fg_alpha, 'radius': state.radius, 'draw_mode': state.draw_mode}
+
+	# other backends
+	output = io.BytesIO()
+	c = CanvasAdapter(output, 'SVG')
+	c.setPageSize((img.size, img.size))
+	geometry.draw(c)
+	c.showPage()
+	assert output.getvalue() == get_adapter_output(CanvasAdapter, 'SVG', f'{params};text;Geometry')
+
+
+def test_render_async():
+	expected = get_pdf_content(lambda c: qr_draw(c, 'Text', size='2cm', radius=0.5))
+
+	async def render():
+		return await qr_render_async('Text', size='2cm', radius=0.5)
+
+	geometry = asyncio.run(render())
+	assert get_pdf_content(geometry.draw) == expected
+
+	async def render_processes():
+		with ProcessPoolExecutor(max_workers=2) as executor:
+			renderer = AsyncRenderer(executor, max_concurrency=2, cache=True)
+			return await asyncio.gather(*[renderer.render(text, QRStyle.from_kwargs(size='2cm', radius=0.5)) for text in ('Text', b'Text', 'Other')])
+
+	geometries = asyncio.run(render_processes())
+	assert [get_pdf_content(geometry.draw) for geometry in geometries[:2]] == [expected, expected]
+
+
+def test_render_async_limits(monkeypatch):
+	lock = threading.Lock()
+	running = []
+	concurrency = []
+	release = threading.Event()
+
+	def slow_build(style, text, cache=None, matrix_cache=None):
+		with lock:
+			running.append(text)
+			concurrency.append(len(running))
+		release.wait(5)
+		time.sleep(0.01)
+		with lock:
+			running.remove(text)
+		return build_geometry(style, text, cache, matrix_cache)
+
+	monkeypatch.setattr(reportlab_qr_code, 'build_geometry', slow_build)
+
+	async def render():
+		with ThreadPoolExecutor(max_workers=4) as executor:
+			renderer = AsyncRenderer(executor, max_concurrency=2)
+			tasks = [asyncio.ensure_future(renderer.render(f'Text {num}')) for num in range(6)]
+			await asyncio.sleep(0.05)
+			tasks[5].cancel()
+			release.set()
+			results = await asyncio.gather(*tasks, return_exceptions=True)
+		return results
+
+	results = asyncio.run(render())
+	assert max(concurrency) == 2
+	assert isinstance(results[5], asyncio.CancelledError)
+	assert len(concurrency) == 5
+	assert all(isinstance(geometry, QRGeometry) for geometry in results[:5])
+
+
+@pytest.mark.parametrize('executor_class', [None, ThreadPoolExecutor])
+def test_render_async_cancel_running(monkeypatch, executor_class):
+	lock = threading.Lock()
+	running = []
+	concurrency = []
+	started = threading.Event()
+	release = threading.Event()
+
+	def slow_build(style, text, cache=None, matrix_cache=None):
+		with lock:
+			running.append(text)
+			concurrency.append(len(running))
+		started.set()
+		release.wait(5)
+		with lock:
+			running.remove(text)
+		return build_geometry(style, text, cache, matrix_cache)
+
+	monkeypatch.setattr(reportlab_qr_code, 'build_geometry', slow_build)
+
+	async def render(executor):
+		renderer = AsyncRenderer(executor, max_concurrency=1)
+		first = asyncio.ensure_future(renderer.render('First'))
+		while not started.is_set():
+			await asyncio.sleep(0.01)
+		first.cancel()
+		second = asyncio.ensure_future(renderer.render('Second'))
+		await asyncio.sleep(0.05)
+		# running job of cancelled task keeps its slot
+		assert concurrency == [1]
+		release.set()
+		results = await asyncio.gather(first, second, return_exceptions=True)
+		# slot is released after failed job
+		for __ in range(2):
+			with pytest.raises(ValueError, match="Invalid version"):
+				await renderer.render('Invalid', version=41)
+		return results
+
+	if executor_class is None:
+		results = asyncio.run(render(None))
+	else:
+		with executor_class(max_workers=4) as executor:
+			results = asyncio.run(render(executor))
+		# slot is released if job can't be submitted
+		renderer = AsyncRenderer(executor, max_concurrency=1)
+		for __ in range(2):
+			with pytest.raises(RuntimeError):
+				asyncio.run(renderer.render('Shutdown'))
+	assert isinstance(results[0], asyncio.CancelledError)
+	assert isinstance(results[1], QRGeometry)
+	assert concurrency == [1, 1, 1, 1]
+
+
+def test_render_async_closed_loop(monkeypatch, caplog):
+	started = threading.Event()
+	release = threading.Event()
+
+	def slow_job():
+		started.set()
+		release.wait(5)
+
+	def slow_build(style, text, cache=None, matrix_cache=None):
+		slow_job()
+		return build_geometry(style, text, cache, matrix_cache)
+
+	monkeypatch.setattr(reportlab_qr_code, 'build_geometry', slow_build)
+
+	async def render(renderer):
+		task = asyncio.ensure_future(renderer.render('Text'))
+		while not started.is_set():
+			await asyncio.sleep(0.01)
+		task.cancel()
+
+	# slot can't be released after loop is closed
+	with ThreadPoolExecutor(max_workers=1) as executor:
+		asyncio.run(render(AsyncRenderer(executor, max_concurrency=1)))
+		release.set()
+	assert not caplog.records
+
+	async def cancel_waiting(renderer):
+		loop = asyncio.get_running_loop()
+		loop.set_default_executor(ThreadPoolExecutor(max_workers=1))
+		release.clear()
+		loop.run_in_executor(None, slow_job)
+		waiting = renderer.submit(loop, slow_job)
+		# job, which has not been started, is cancelled
+		assert waiting.cancel()
+		release.set()
+
+	asyncio.run(cancel_waiting(AsyncRenderer()))
+
+
+def test_render_async_loops():
+	renderer = AsyncRenderer(max_concurrency=1)
+
+	async def render():
+		return await asyncio.gather(*[renderer.render(f'Text {num}') for num in range(3)])
+
+	# semaphore of closed loop is not reused
+	for __ in range(3):
+		assert all(isinstance(geometry, QRGeometry) for geometry in asyncio.run(render()))
+	assert len(renderer.semaphores) == 1
+
+
+def test_threads():
+	switch_interval = sys.getswitchinterval()
+	sys.setswitchinterval(1e-6) # force frequent thread switching
+	try:
+		style = QRStyle.from_kwargs(size='3cm', radius=0.5, hole='40%:40%:20%:20%', draw_parts=[
+			{'draw': 'all-eyes-align'},
+			{'draw': 'eyeballs+alignballs', 'fg': '#ff0000', 'radius': 1},
+			{'draw': 'eyepupils+alignpupils', 'fg': '#0000ff', 'radius': 0},
+		])
+		cache = GeometryCache()
+
+		def render(document):
+			def draw(c):
+				for num in range(10):
+					qr_draw(c, f'Document {document}, code {num % 4}', x=num * 20, y=num * 20, cache=cache, style=style)
+			return get_pdf_content(draw)
+
+		serial = [render(document) for document in range(16)]
+		cache.clear()
+		with ThreadPoolExecutor(max_workers=8) as executor:
+			concurrent = list(executor.map(render, range(16)))
+	finally:
+		sys.setswitchinterval(switch_interval)
+	assert concurrent == serial
+
+
+@pytest.mark.parametrize('params', [
+	';text;Text',
+	'radius=0.5,version=5;text;Text',
+	'radius=1,enhanced_path=1,negative=1;text;Text',
+	'mask=1,radius=0.3;text;Text',
+	'negative=1,draw=-all;text;Text',
+	'draw=all-eyes,draw=eyes,radius=2.5,fg=#ff0000;text;Text',
+	'draw_mode=rects,negative=1,draw=all-eyes,draw=eyes,draw_mode=path,radius=1;text;Text',
+])
+def test_fast_path(monkeypatch, params):
+	fast = get_pdf_content(lambda c: qr(c, params))
+	monkeypatch.setattr(ReportlabImageBase, 'use_fast_path', False)
+	assert get_pdf_content(lambda c: qr(c, params)) == fast
+
+
+def test_grid_positions():
+	assert grid_positions(2, 3, 10, '1cm', x=5, y=1) == [
+		(5, 1 + toLength('2cm')), (15, 1 + toLength('2cm')),
+		(5, 1 + toLength('1cm')), (15, 1 + toLength('1cm')),
+		(5, 1), (15, 1),
+	]
+
+
+def test_draw_sheets():
+	texts = [f'Label {num}' for num in range(7)]
+	sheets = get_pdf_content(lambda c: qr_draw_sheets(c, texts, 2, 2, '3cm', '3cm', x='1cm', y='1cm', size='2cm'))
+	assert sheets.count(b'/Type /Page\n') == 2
+	empty = get_pdf_content(lambda c: qr_draw_sheets(c, [], 2, 2, '3cm', '3cm'))
+	assert empty.count(b'/Type /Page\n') == 1
+
+
+def test_inverted(bitmap_backend):
 	img_default = build_qrcode(*parse_params_string(';text;Text'))
 	img_standard = build_qrcode(*parse_params_string('invert=0;text;Text'))
 	img_inverted = build_qrcode(*parse_params_string('invert=1;text;Text'))
@@ -377,3 +1301,522 @@ def test_inverted():
 
 	for a, b in zip(img_standard.bitmap, img_inverted.bitmap):
 		assert a == 1 - b # check if is inverted
+
+
+class ReferenceCanvasAdapter(CanvasAdapter):
+	"""
+	Original implementation of drawPath
+	"""
+
+	def drawPath(self, path, stroke=1, fill=0, fillMode=None):
+		path = deepcopy(path)
+		path.strokeWidth = stroke
+		path.fillMode = fillMode
+		if fill:
+			path.fillColor = toColor(self.fill_color)
+			path.fillOpacity = self.fill_alpha
+		else:
+			path.fillColor = None
+		for i in range(0, len(path.points), 2):
+			path.points[i], path.points[i + 1] = transformPoint(self.transform_stack[-1], (path.points[i], path.points[i + 1]))
+		self.drawing.add(path)
+
+
+def get_adapter_output(adapter_class, file_format, params):
+	output = io.BytesIO()
+	img = build_qrcode(*parse_params_string(params))
+	c = adapter_class(output, file_format)
+	c.setPageSize((img.size, img.size))
+	c.saveState()
+	img.save(c)
+	c.restoreState()
+	c.showPage()
+	return output.getvalue()
+
+
+def require_render_pm():
+	try:
+		renderPM.drawToString(Drawing(1, 1), fmt='PNG')
+	except RenderPMError:
+		pytest.skip("renderPM backend is not available")
+
+
+@pytest.mark.parametrize('file_format', ['EPS', 'SVG', 'PNG'])
+@pytest.mark.parametrize('params', [
+	'version=10;text;Adapter',
+	'version=10,radius=0.5,negative=1,fg=#ff000080;text;Adapter',
+	'draw=all-eyes,draw=eyes,radius=3,fg=#0000ff;text;Adapter',
+])
+def test_canvas_adapter(file_format, params):
+	if file_format == 'PNG':
+		require_render_pm()
+	assert get_adapter_output(CanvasAdapter, file_format, params) == get_adapter_output(ReferenceCanvasAdapter, file_format, params)
+
+
+def is_inside(polygons, x, y):
+	"""
+	Even-odd rule, polygons are implicitly closed
+	"""
+	inside = False
+	for polygon in polygons:
+		for (x1, y1), (x2, y2) in zip(polygon, polygon[1:] + polygon[:1]):
+			if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+				inside = not inside
+	return inside
+
+
+def get_colors(shapes, points):
+	"""
+	Returns colors of points, shapes (polygons, rgb, alpha) are composed over
+	white background
+	"""
+	colors = []
+	for x, y in points:
+		color = (255, 255, 255)
+		for polygons, rgb, alpha in shapes:
+			if is_inside(polygons, x, y):
+				color = tuple(value * alpha + base * (1 - alpha) for value, base in zip(rgb, color))
+		colors.append(tuple(round(value) for value in color))
+	return colors
+
+
+def flatten_curve(start, *controls, steps=8):
+	"""
+	Returns points of cubic bezier curve after start point
+	"""
+	(x0, y0), (x1, y1), (x2, y2), (x3, y3) = start, *controls
+	points = []
+	for step in range(1, steps + 1):
+		t = step / steps
+		u = 1 - t
+		points.append((
+			u*u*u*x0 + 3*u*u*t*x1 + 3*u*t*t*x2 + t*t*t*x3,
+			u*u*u*y0 + 3*u*u*t*y1 + 3*u*t*t*y2 + t*t*t*y3,
+		))
+	return points
+
+
+def get_drawing_shapes(drawing):
+	"""
+	Returns filled shapes of drawing in coordinates with y axis pointing down
+	"""
+	shapes = []
+	for path in drawing.contents:
+		if path.fillColor is None:
+			continue
+		points = iter(zip(path.points[0::2], path.points[1::2]))
+		polygons = []
+		for operator in path.operators:
+			if operator == 0: # move
+				polygons.append([next(points)])
+			elif operator == 1: # line
+				polygons[-1].append(next(points))
+			elif operator == 2: # curve
+				polygons[-1] += flatten_curve(polygons[-1][-1], next(points), next(points), next(points))
+		polygons = [[(x, drawing.height - y) for x, y in polygon] for polygon in polygons]
+		shapes.append((polygons, path.fillColor.bitmap_rgb(), path.fillOpacity))
+	return shapes
+
+
+def get_module_points(qr, page_height):
+	"""
+	Returns centers of modules and one ring of modules around code in
+	coordinates with y axis pointing down
+	"""
+	scale = (qr.size - qr.padding * 2) / qr.width
+	left = qr.x + qr.padding
+	top = page_height - qr.y - qr.size + qr.padding
+	return [
+		(left + (col + 0.5) * scale, top + (row + 0.5) * scale)
+		for row in range(-1, qr.width + 1)
+		for col in range(-1, qr.width + 1)
+	]
+
+
+def get_drawing_route(params, file_format='SVG'):
+	c = CanvasAdapter(io.BytesIO(), file_format)
+	qr = build_qrcode(*parse_params_string(params))
+	draw_code(qr, c)
+	return qr, c.drawing
+
+
+@pytest.mark.parametrize('params', [
+	'version=1,size=116,padding=4;text;Raster',
+	'version=1,size=116,padding=4,negative=1,fg=#203040,bg=#eeeeee;text;Raster',
+	'version=2,size=66,padding=4,draw_mode=rects,radius=0.5,draw=all-eyes,draw=eyes,fg=#ff0000;text;Raster',
+	'version=1,size=58,padding=4,hole=8:8:5:5,fg=#00000080;text;Raster',
+])
+def test_draw_raster_orientation(params):
+	# raster is drawn directly only if pixels are equal to rendered drawing
+	c = CanvasAdapter(io.BytesIO(), 'PNG')
+	draw_code(build_qrcode(*parse_params_string(params)), c)
+	assert c.raster is not None
+	qr, drawing = get_drawing_route(params)
+	pixels = [(int(x), int(y)) for x, y in get_module_points(qr, qr.size)]
+	colors = get_colors(get_drawing_shapes(drawing), [(x + 0.5, y + 0.5) for x, y in pixels])
+	for pixel, color in zip(pixels, colors):
+		assert all(abs(a - b) <= 1 for a, b in zip(c.raster.getpixel(pixel), color)), pixel
+	# eye1 is in top left corner
+	assert c.raster.getpixel(pixels[qr.width + 3]) != (255, 255, 255)
+
+
+@pytest.mark.parametrize('params', [
+	'version=1,size=116,padding=4;text;Raster',
+	'version=1,size=116,padding=4,fg=#20304080,bg=#ff000040;text;Raster',
+	'version=1,size=116,padding=4,negative=1,fg=#203040,bg=#eeeeee;text;Raster',
+	'version=2,size=66,padding=4,draw_mode=rects,radius=0.5,draw=all-eyes,draw=eyes,fg=#ff0000c0;text;Raster',
+	'version=1,size=58,padding=4,hole=8:8:5:5,fg=#00000080;text;Raster',
+])
+def test_draw_raster_render_pm(params):
+	# direct raster must have exactly same pixels as drawing rendered by renderPM
+	require_render_pm()
+	c = CanvasAdapter(io.BytesIO(), 'PNG')
+	draw_code(build_qrcode(*parse_params_string(params)), c)
+	assert c.raster is not None
+	__, drawing = get_drawing_route(params)
+	rendered = renderPM.drawToPIL(drawing).convert('RGB')
+	assert rendered.size == c.raster.size
+	assert list(rendered.getdata()) == list(c.raster.getdata())
+
+
+SVG_PATH_ARGUMENTS = {'M': 2, 'L': 2, 'C': 6, 'H': 1, 'V': 1, 'h': 1, 'v': 1}
+
+
+def get_svg_polygons(data):
+	"""
+	Returns polygons of path data written by SvgCanvas
+	"""
+	polygons = []
+	x = y = 0.0
+	tokens = iter(re.findall(r'[A-Za-z]|-?(?:\d+\.?\d*|\.\d+)', data))
+	for command in tokens:
+		if command in 'Zz':
+			x, y = polygons[-1][0]
+			continue
+		args = [float(next(tokens)) for __ in range(SVG_PATH_ARGUMENTS[command])]
+		if command == 'M':
+			polygons.append([])
+		if command == 'C':
+			polygons[-1] += flatten_curve((x, y), args[0:2], args[2:4], args[4:6])[:-1]
+		if command in 'MLC':
+			x, y = args[-2:]
+		elif command == 'H':
+			x = args[0]
+		elif command == 'V':
+			y = args[0]
+		elif command == 'h':
+			x += args[0]
+		else:
+			y += args[0]
+		polygons[-1].append((x, y))
+	return polygons
+
+
+def get_svg_shapes(svg):
+	"""
+	Returns filled shapes of SVG written by SvgCanvas
+	"""
+	shapes = []
+	translate_x, translate_y, scale = 0.0, 0.0, 1.0
+	for element, attributes in re.findall(r'<(rect|g|path)\b([^>]*)>', svg):
+		attributes = dict(re.findall(r'([\w-]+)="([^"]*)"', attributes))
+		if element == 'g':
+			translate_x, translate_y, scale = map(float, re.findall(r'-?[\d.]+', attributes['transform']))
+			continue
+		if element == 'rect':
+			x, y, w, h = (float(attributes[key]) for key in ('x', 'y', 'width', 'height'))
+			polygons = [[(x, y), (x + w, y), (x + w, y + h), (x, y + h)]]
+		else:
+			polygons = [
+				[(translate_x + x * scale, translate_y + y * scale) for x, y in polygon]
+				for polygon in get_svg_polygons(attributes['d'])
+			]
+		shapes.append((polygons, toColor(attributes['fill']).bitmap_rgb(), float(attributes.get('fill-opacity', 1))))
+	return shapes
+
+
+@pytest.mark.parametrize('params', [
+	'version=2;text;SVG',
+	'version=2,radius=0.5,enhanced_path=1,fg=#ff000080,bg=#eeeeee;text;SVG',
+	'version=2,radius=2.5,negative=1,padding=10%;text;SVG',
+	'version=2,draw_mode=rects,invert=1,bg=#203040,fg=#ffffff;text;SVG',
+	'version=5,hole=30%:30%:40%:40%,error_correction=H,draw=all-eyes,radius=0.5,draw=eyes,fg=#0000ff;text;SVG',
+	'version=2,x=10,y=20,size=3cm;text;SVG',
+])
+def test_svg_canvas_orientation(params):
+	# direct SVG output has same shapes and orientation as rendered drawing
+	output = io.BytesIO()
+	c = SvgCanvas(output)
+	draw_code(build_qrcode(*parse_params_string(params)), c)
+	c.showPage()
+	qr, drawing = get_drawing_route(params)
+	points = get_module_points(qr, qr.size)
+	colors = get_colors(get_svg_shapes(output.getvalue().decode('utf-8')), points)
+	assert colors == get_colors(get_drawing_shapes(drawing), points)
+	# eye1 is in top left corner
+	if not qr.negative:
+		assert colors[qr.width + 3] != (255, 255, 255)
+
+
+@pytest.mark.parametrize('module', ['reportlab_qr_code', 'reportlab_qr_code.__main__'])
+def test_lazy_imports(module):
+	# optional backends are imported only when used
+	lazy_modules = ['numpy', 'reportlab.graphics.shapes', 'reportlab.graphics.renderPM', 'reportlab.graphics.renderPS', 'reportlab.graphics.renderSVG', 'concurrent.futures.process', 'asyncio', 'socket', 'socketserver']
+	code = f'import sys, {module}; print(" ".join(name for name in {lazy_modules!r} if name in sys.modules))'
+	result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+	assert result.stdout.split() == []
+
+
+def get_request_frames(*requests):
+	return b''.join(struct.pack('>I', len(payload)) + payload for payload in (json.dumps(request).encode('utf-8') for request in requests))
+
+
+def read_responses(stream):
+	responses = []
+	header = stream.read(5)
+	while header:
+		status, size = struct.unpack('>BI', header)
+		responses.append((status, stream.read(size)))
+		header = stream.read(5)
+	return responses
+
+
+def test_render_request():
+	output = io.BytesIO()
+	img = build_qrcode(*parse_params_string('version=2,fg=#ff0000;text;Serve'))
+	c = CanvasAdapter(output, 'EPS')
+	c.setPageSize((img.size, img.size))
+	c.saveState()
+	img.save(c)
+	c.restoreState()
+	c.showPage()
+	assert render_request(json.dumps(['--format', 'EPS', '--version', '2', '--fg', '#ff0000', 'Serve'])) == output.getvalue()
+	assert render_request(json.dumps({'params': 'version=2,fg=#ff0000;text;Serve', 'format': 'EPS'})) == output.getvalue()
+	assert render_request(json.dumps(['--format', 'SVG', 'Serve', '--draw', 'eyes', '--fg', '#ff0000', '--draw', 'all-eyes'])).count(b'<path') == 2
+	assert render_request(json.dumps(['--base64', 'U2VydmU='])).startswith(b'%PDF')
+	assert render_request(json.dumps(['--no-compress', 'First', 'Second', 'Third'])).count(b'/Type /Page\n') == 3
+	assert render_request(json.dumps(['--no-compress', '--page-size', 'A4', 'First', 'Second', 'Third'])).count(b'/Type /Page\n') == 1
+	for request, message in (
+		(['--format', 'SVG'], "Missing text"),
+		(['--outfile', 'code.pdf', 'Serve'], "Option outfile can't be used in request"),
+		(['--input-file', 'texts.txt', 'Serve'], "Option input_file can't be used in request"),
+		(['--null', 'Serve'], "Option null can't be used in request"),
+		(['--help'], "unrecognized arguments: --help"),
+		(['--format', 'SVG', '--gradient', 'linear 0 0 1 1 #ff0000 #0000ff', 'Serve'], "Gradient is supported only for PDF format"),
+		(['--format', 'SVG', 'First', 'Second'], "Multiple codes and --page-size are supported only for PDF format"),
+		({'params': ';text;Serve', 'format': 'DOC'}, "Unknown format DOC"),
+		({'text': 'Serve'}, "Request object must contain params and optionally format and compress"),
+		('Serve', "Request must be list of arguments or object"),
+	):
+		with pytest.raises(ValueError, match=message):
+			render_request(json.dumps(request))
+
+
+def test_serve_stream():
+	reader = io.BytesIO(get_request_frames(['--format', 'SVG', 'Serve'], ['--format', 'SVG']) + b'\x00\x00')
+	writer = io.BytesIO()
+	serve_stream(reader, writer, render_request)
+	writer.seek(0)
+	assert read_responses(writer) == [
+		(0, render_request(json.dumps(['--format', 'SVG', 'Serve']))),
+		(1, b'Missing text'),
+		(1, b'Truncated request'),
+	]
+
+	writer = io.BytesIO()
+	serve_stream(io.BytesIO(struct.pack('>I', 1 << 30)), writer, render_request)
+	writer.seek(0)
+	assert read_responses(writer) == [(1, b'Request is too large')]
+
+
+def test_serve_stdio(monkeypatch):
+	stdin = io.TextIOWrapper(io.BytesIO(get_request_frames(['--format', 'SVG', 'Serve'])))
+	stdout = io.TextIOWrapper(io.BytesIO())
+	monkeypatch.setattr(sys, 'argv', ['reportlab_qr_code', '--serve', '-'])
+	monkeypatch.setattr(sys, 'stdin', stdin)
+	monkeypatch.setattr(sys, 'stdout', stdout)
+	main()
+	# stdout is restored after end of requests
+	assert sys.stdout is stdout
+	stdout.buffer.seek(0)
+	assert read_responses(stdout.buffer) == [(0, render_request(json.dumps(['--format', 'SVG', 'Serve'])))]
+
+
+@pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason="Unix sockets are not supported")
+def test_serve_socket(tmp_path):
+	path = str(tmp_path / 'serve.sock')
+	server = create_server(path, render_request)
+	thread = threading.Thread(target=server.serve_forever)
+	thread.start()
+	try:
+		with pytest.raises(ValueError, match="already running"):
+			create_server(path, render_request)
+
+		def request(num, results):
+			with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+				sock.connect(path)
+				sock.sendall(get_request_frames(*(['--format', 'SVG', f'Client {num} {item}'] for item in range(5))))
+				sock.shutdown(socket.SHUT_WR)
+				with sock.makefile('rb') as stream:
+					results[num] = read_responses(stream)
+
+		results = {}
+		clients = [threading.Thread(target=request, args=(num, results)) for num in range(4)]
+		for client in clients:
+			client.start()
+		for client in clients:
+			client.join()
+		for num in range(4):
+			assert results[num] == [(0, render_request(json.dumps(['--format', 'SVG', f'Client {num} {item}']))) for item in range(5)]
+	finally:
+		server.shutdown()
+		server.server_close()
+		thread.join()
+
+	# socket of terminated server is replaced
+	server = create_server(path, render_request)
+	server.server_close()
+
+
+class PageCanvas:
+	def __init__(self):
+		self.pages = 0
+		self.page_size = None
+
+	def setPageSize(self, size):
+		self.page_size = size
+
+	def showPage(self):
+		self.pages += 1
+
+
+def test_tile_layout():
+	c = PageCanvas()
+	layout = TileLayout(c, (100, 100), margin=10, gutter=5)
+	layout.finish()
+	assert c.page_size == (100, 100)
+	assert c.pages == 0
+
+	# 2 codes in row, 2 rows on page
+	assert [layout.place(35) for __ in range(5)] == [(10, 55), (50, 55), (10, 15), (50, 15), (10, 55)]
+	assert c.pages == 1
+	# codes are aligned to top of row, next row starts below highest code
+	assert layout.place(20) == (50, 70)
+	assert layout.place(20) == (10, 30)
+	# code larger than page is placed alone to new page
+	assert layout.place(200) == (10, -110)
+	assert c.pages == 2
+	assert layout.place(10) == (10, 80)
+	assert c.pages == 3
+	layout.finish()
+	assert c.pages == 4
+
+
+def run_main(monkeypatch, argv, stdin=''):
+	monkeypatch.setattr(sys, 'argv', ['reportlab_qr_code', '--no-compress', *argv])
+	monkeypatch.setattr(sys, 'stdin', io.StringIO(stdin))
+	main()
+
+
+def test_main_multiple_texts(monkeypatch, tmp_path):
+	input_file = tmp_path / 'texts.txt'
+	input_file.write_text(''.join(f'Label {num}\n' for num in range(50)), encoding='utf-8')
+	outfile = tmp_path / 'codes.pdf'
+	for argv, stdin, pages in (
+		(['First', 'Second'], '', 2),
+		([], 'Multi\nline', 1),
+		(['--null'], 'First\0Second\0Third\0', 3),
+		(['First', '--input-file', str(input_file)], '', 51),
+		(['--input-file', '-', '--null', '--page-size', '10cm:10cm', '--size', '4cm', '--margin', '0', '--gutter', '0'], 'First\0Second\0Third\0Fourth\0Fifth', 2),
+		(['--input-file', str(input_file), '--page-size', 'A4', '--size', '3cm'], '', 2),
+		(['--input-file', str(input_file), '--page-size', 'A4', '--draw', 'eyes', '--draw', 'all-eyes'], '', 4),
+	):
+		run_main(monkeypatch, ['--outfile', str(outfile), *argv], stdin)
+		assert outfile.read_bytes().count(b'/Type /Page\n') == pages
+
+	with pytest.raises(ValueError, match="supported only for PDF"):
+		run_main(monkeypatch, ['--outfile', str(outfile), '--format', 'SVG', 'First', 'Second'])
+	with pytest.raises(ValueError, match="can't be used with --batch"):
+		run_main(monkeypatch, ['--batch', str(input_file), 'First'])
+
+
+def test_main_batch(monkeypatch, tmp_path, capsys):
+	from reportlab import rl_config
+	monkeypatch.setattr(rl_config, 'invariant', 1)
+	texts = [f'Label {num}' for num in range(10)]
+	lines_file = tmp_path / 'texts.txt'
+	lines_file.write_text(''.join(f'{text}\n\n' for text in texts), encoding='utf-8')
+	jsonl = ''.join(json.dumps({'text': text, 'fg': '#ff0000', 'radius': 0.5}) + '\n' for text in texts)
+	outfile = tmp_path / 'codes.pdf'
+
+	# single PDF, one page for each record, same document for any number of jobs
+	documents = []
+	for jobs in ('1', '2'):
+		run_main(monkeypatch, ['--batch', str(lines_file), '--jobs', jobs, '--outfile', str(outfile)])
+		documents.append(outfile.read_bytes())
+		assert documents[-1].count(b'/Type /Page\n') == len(texts)
+		run_main(monkeypatch, ['--batch', '-', '--batch-format', 'jsonl', '--jobs', jobs, '--outfile', str(outfile)], jsonl)
+		documents.append(outfile.read_bytes())
+		assert documents[-1].count(b'/Type /Page\n') == len(texts)
+	assert documents[0] == documents[2]
+	assert documents[1] == documents[3]
+	assert documents[0] != documents[1]
+
+	# separate files named by record number, order is kept
+	outputs = []
+	for jobs in ('1', '2'):
+		outdir = tmp_path / f'jobs{jobs}'
+		run_main(monkeypatch, ['--batch', str(lines_file), '--jobs', jobs, '--format', 'SVG', '--outdir', str(outdir)])
+		assert sorted(path.name for path in outdir.iterdir()) == [f'{num:06d}.svg' for num in range(len(texts))]
+		outputs.append([(outdir / f'{num:06d}.svg').read_bytes() for num in range(len(texts))])
+	assert outputs[0] == outputs[1]
+	for num, text in enumerate(texts):
+		run_main(monkeypatch, ['--format', 'SVG', '--outfile', str(tmp_path / 'single.svg'), text])
+		assert (tmp_path / 'single.svg').read_bytes() == outputs[0][num]
+
+	with pytest.raises(ValueError, match="supported only for PDF"):
+		run_main(monkeypatch, ['--batch', str(lines_file), '--jobs', '1', '--format', 'SVG'])
+
+	# global flags can be disabled in record
+	records = '{"text": "Label 0", "invert": false, "negative": false}\n{"text": "TGFiZWwgMQ==", "base64": true, "radius": -0.5, "invert": false}\n'
+	run_main(monkeypatch, ['--batch', '-', '--batch-format', 'jsonl', '--jobs', '1', '--invert', '--negative', '--format', 'SVG', '--outdir', str(tmp_path / 'flags')], records)
+	assert (tmp_path / 'flags' / '000000.svg').read_bytes() == outputs[0][0]
+	assert (tmp_path / 'flags' / '000001.svg').read_bytes() != outputs[0][1]
+
+	# invalid records are reported with line number
+	for records, message in (
+		('{"text": "First"}\n\n{"text": "Second", "unknown": 1}\n', "line 3: Unknown record option 'unknown'"),
+		('{"text": "First"}\n{"fg": "#ff0000"}\n', "line 2: Option 'text' must be string"),
+		('["First"]\n', "line 1: Record is not an object"),
+		('{"text": \n', "line 1: Expecting value"),
+		('{"text": "First", "radius": "x"}\n', "line 1: argument --radius: invalid float value"),
+		('{"text": "First", "error_correction": "X"}\n', "line 1: argument --error_correction: invalid choice"),
+		('{"text": "First"}\n{"text": "Second", "hole": "1:2"}\n', "line 2: Wrong value '1:2' for attribute hole"),
+		('{"text": "First", "fg": "nocolor"}\n', "line 1: Wrong value 'nocolor' for attribute fg"),
+		('{"text": "First", "invert": 1}\n', "line 1: Option 'invert' must be boolean"),
+		('{"text": "First", "size": null}\n', "line 1: Option 'size' must be string or number"),
+	):
+		with pytest.raises(SystemExit):
+			run_main(monkeypatch, ['--batch', '-', '--batch-format', 'jsonl', '--jobs', '1', '--outfile', str(outfile)], records)
+		assert message in capsys.readouterr().err
+
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks')
+
+
+@pytest.mark.parametrize('script', sorted(name for name in os.listdir(BENCHMARKS_DIR) if name.endswith('.py')))
+def test_benchmark_imports(script, tmp_path):
+	# scripts are run outside of repository without installed package
+	env = {key: value for key, value in os.environ.items() if key != 'PYTHONPATH'}
+	code = f'import runpy; namespace = runpy.run_path({os.path.join(BENCHMARKS_DIR, script)!r})'
+	if script == 'startup.py': # modules are imported in measured subprocess
+		code += '; assert "reportlab_qr_code" in namespace["import_times"]("reportlab_qr_code")'
+	subprocess.run([sys.executable, '-c', code], cwd=tmp_path, env=env, check=True)
+
+
+def test_benchmark_suite(tmp_path):
+	env = {key: value for key, value in os.environ.items() if key != 'PYTHONPATH'}
+	baseline = tmp_path / 'baseline.json'
+	script = os.path.join(BENCHMARKS_DIR, 'suite.py')
+	subprocess.run([sys.executable, script, '--filter', 'build/1/L', '--repeat', '1', '--save', str(baseline)], cwd=tmp_path, env=env, check=True, stdout=subprocess.DEVNULL)
+	assert list(json.loads(baseline.read_text(encoding='utf-8'))) == ['build/1/L']